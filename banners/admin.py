@@ -1,15 +1,18 @@
 from urllib.parse import urljoin
 
+from django import forms
 from django.contrib import admin
 from django.contrib.auth import get_permission_codename
+from django.core.exceptions import ValidationError
 from django_select2.forms import Select2MultipleWidget
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 
-from banners.backend import publish
+from banners.jobs import enqueue_publish
+from helpers.admin import EstimatedCountPaginator, PaginatedInlineFormSet
 from helpers.fields import ChoiceArrayField
 from banners.models import (
-    Banner, Slot, Page, Publication, BannerSnapshot,
+    Banner, Slot, Page, Publication, BannerSnapshot, PublishJob,
 )
 
 
@@ -21,8 +24,27 @@ class ArrayFieldSelectMultiple(Select2MultipleWidget):
         return attrs
 
 
+class BannerForm(forms.ModelForm):
+    body = forms.CharField(widget=forms.Textarea)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.body_content_id is not None:
+            self.initial.setdefault('body', self.instance.body)
+
+    def _post_clean(self):
+        super()._post_clean()
+        if 'body' in self.cleaned_data:
+            self.instance.body = self.cleaned_data['body']
+
+    class Meta:
+        model = Banner
+        exclude = ('body_content', )
+
+
 class BannerAdmin(admin.ModelAdmin):
     model = Banner
+    form = BannerForm
     fieldsets = (
         (None, {
             'fields': ('id', 'name', 'slot', ),
@@ -60,19 +82,31 @@ class BannerAdmin(admin.ModelAdmin):
     search_fields = ('name', )
 
     list_display = (
-        'name', 'create_time', 'update_time', 'priority',
+        'name', 'slot', 'create_time', 'update_time', 'priority',
         'has_changes_to_publish',
         'stopped',
     )
     list_filter = (
         'stopped',
     )
+    list_select_related = (
+        'slot',
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     actions = (
         'publish',
+        'publish_selected',
         'duplicate',
     )
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'slot':
+            # hashing the saved banner needs the page of its slot
+            kwargs['queryset'] = Slot.objects.select_related('page')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
     def has_changes_to_publish(self, obj):
         return obj.published_at is None or obj.update_time > obj.published_at
     has_changes_to_publish.boolean = True
@@ -85,21 +119,25 @@ class BannerAdmin(admin.ModelAdmin):
         )
 
     def publish(self, request, queryset):
-        republished_banners, newly_published = publish(publisher=request.user)
-        self.message_user(
-            request,
-            f'Kept published: {republished_banners} banners',
-        )
-        self.message_user(
-            request,
-            f'Newly Published: {newly_published} banners',
-        )
+        self.enqueue_publish(request)
+    publish.allowed_permissions = ('publish',)
+    publish.short_description = 'Publish all changed banners'
+
+    def publish_selected(self, request, queryset):
+        self.enqueue_publish(request, banners=queryset)
+    publish_selected.allowed_permissions = ('publish',)
+    publish_selected.short_description = 'Publish selected banners only'
+
+    def enqueue_publish(self, request, banners=None):
+        job = enqueue_publish(publisher=request.user, banners=banners)
+        url = reverse('admin:banners_publishjob_change', args=[job.id, ])
         self.message_user(
             request,
-            f'Total currently published: '
-            f'{republished_banners + newly_published} banners',
+            format_html(
+                'Publishing in background, follow <a href="{}">{}</a>',
+                url, f'publish job {job.id}',
+            ),
         )
-    publish.allowed_permissions = ('publish',)
 
     def has_publish_permission(self, request):
         """Does the user have the publish permission?"""
@@ -177,6 +215,26 @@ class BannerSnapshotAdmin(admin.ModelAdmin):
         'banner_link',
     )
     readonly_fields = fields
+    list_display = (
+        'name', 'create_time', 'banner_link', 'slot_link',
+    )
+    list_select_related = (
+        'original_banner',
+    )
+    search_fields = ('name', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_object(self, request, object_id, from_field=None):
+        # only the change view shows the body, keep it out of the changelist
+        queryset = self.get_queryset(request).\
+            select_related('original_banner', 'body_content')
+        field = BannerSnapshot._meta.pk if from_field is None else \
+            BannerSnapshot._meta.get_field(from_field)
+        try:
+            return queryset.get(**{field.name: field.to_python(object_id)})
+        except (BannerSnapshot.DoesNotExist, ValidationError, ValueError):
+            return None
 
     def has_view_permission(self, request, obj=None):
         return True
@@ -193,7 +251,7 @@ class BannerSnapshotAdmin(admin.ModelAdmin):
     @staticmethod
     def banner_link(obj):
         url = reverse('admin:banners_banner_change',
-                      args=[obj.original_banner.id, ])
+                      args=[obj.original_banner_id, ])
         return format_html(
             '<a href="{}">Banner {}</a>',
             url, obj.original_banner.name,
@@ -216,6 +274,8 @@ class BannerSnapshotAdmin(admin.ModelAdmin):
 
 class BannerSnapshotInlineAdmin(admin.TabularInline):
     model = BannerSnapshot.publications_log.through
+    formset = PaginatedInlineFormSet
+    template = 'admin/banners/publication/paginated_tabular.html'
 
     fields = (
         'snapshot_link',
@@ -225,6 +285,18 @@ class BannerSnapshotInlineAdmin(admin.TabularInline):
     verbose_name = 'Banner Snapshot'
     verbose_name_plural = 'Published Banners Snapshots'
 
+    def get_queryset(self, request):
+        return super(BannerSnapshotInlineAdmin, self).get_queryset(request).\
+            select_related('bannersnapshot')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super(BannerSnapshotInlineAdmin, self).get_formset(
+            request, obj, **kwargs
+        )
+        formset.request = request
+        formset.page_param = 'snapshots_page'
+        return formset
+
     def has_view_permission(self, request, obj=None):
         return True
 
@@ -258,22 +330,106 @@ class PublicationAdmin(admin.ModelAdmin):
         'published_at',
         'published_by',
         'state',
+        'complete_snapshots_log',
+        'build_duration',
+        'build_phases_display',
+        'num_re_published',
+        'num_newly_published',
+        'payload_size',
+        'num_queries',
+    )
+    fieldsets = (
+        (None, {
+            'fields': (
+                'create_time',
+                'update_time',
+                'published_at',
+                'published_by',
+                'state',
+                'complete_snapshots_log',
+            ),
+        }),
+        ('Build', {
+            'fields': (
+                'build_duration',
+                'build_phases_display',
+                'num_re_published',
+                'num_newly_published',
+                'payload_size',
+                'num_queries',
+            ),
+        }),
     )
-    fields = readonly_fields
     list_filter = (
         'state',
     )
     list_display = (
         'id', 'create_time', 'state', 'published_at', 'published_by',
+        'build_duration', 'num_newly_published', 'num_re_published',
+        'payload_size', 'num_queries',
     )
+    list_select_related = (
+        'published_by',
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [
         BannerSnapshotInlineAdmin,
     ]
     exclude = ('publications_log', )
 
+    @staticmethod
+    def build_phases_display(obj):
+        return format_html_join(
+            '\n', '<div>{}: {}s</div>',
+            (
+                (phase, round(seconds, 3))
+                for phase, seconds in obj.build_phases
+            ),
+        )
+
+    build_phases_display.short_description = 'Build phases'
+
+
+class PublishJobAdmin(admin.ModelAdmin):
+    model = PublishJob
+    readonly_fields = (
+        'id',
+        'state',
+        'step',
+        'progress',
+        'created_by',
+        'banners',
+        'publication',
+        'num_re_published',
+        'num_newly_published',
+        'error',
+        'create_time',
+        'started_at',
+        'finished_at',
+    )
+    fields = readonly_fields
+    list_display = (
+        'id', 'create_time', 'state', 'progress', 'step', 'created_by',
+        'finished_at',
+    )
+    list_filter = (
+        'state',
+    )
+    list_select_related = (
+        'created_by',
+    )
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 admin.site.register(Banner, BannerAdmin)
 admin.site.register(Publication, PublicationAdmin)
 admin.site.register(Slot, SlotAdmin)
 admin.site.register(Page, PageAdmin)
 admin.site.register(BannerSnapshot, BannerSnapshotAdmin)
+admin.site.register(PublishJob, PublishJobAdmin)
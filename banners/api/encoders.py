@@ -0,0 +1,118 @@
+import json
+
+from django.utils import timezone
+
+
+def encode_datetime(value):
+    # same as rest_framework.fields.DateTimeField
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def encode_str(value):
+    return None if value is None else str(value)
+
+
+def encode_slot(slot):
+    page = slot['page']
+    return {
+        'id': encode_str(slot['id']),
+        'name': encode_str(slot['name']),
+        'page': None if page is None else {
+            'id': encode_str(page['id']),
+            'name': encode_str(page['name']),
+        },
+    }
+
+
+# (serialized name, selected column, encoder of not null values) in the
+# order of ``BannerSnapshotModelSerializer`` fields
+SNAPSHOT_FIELDS = (
+    ('id', 'id', str),
+    ('name', 'name', str),
+    ('priority', 'priority', int),
+    ('countries', 'countries', list),
+    ('languages', 'languages', list),
+    ('start_time', 'start_time', encode_datetime),
+    ('end_time', 'end_time', encode_datetime),
+    ('dismissible', 'dismissible', bool),
+    ('stopped', 'stopped', bool),
+    ('body', 'body_content__content', str),
+    ('slot', 'slot', encode_slot),
+    ('segments', 'segments', list),
+)
+
+
+SNAPSHOT_FIELD_NAMES = tuple(name for name, _, _ in SNAPSHOT_FIELDS)
+
+
+def select_fields(fields=None, exclude=None):
+    """
+    Snapshot fields limited to the ``fields`` names and without
+    the ``exclude`` ones, keeping their serializer order.
+    """
+    return tuple(
+        field for field in SNAPSHOT_FIELDS
+        if (fields is None or field[0] in fields) and
+        (exclude is None or field[0] not in exclude)
+    )
+
+
+class SnapshotEncoder(object):
+    """
+    Serializes snapshots from ``values_list`` rows exactly like
+    ``BannerSnapshotModelSerializer`` serializes model instances,
+    without building instances or running serializer fields.
+
+    Only columns of the given ``fields`` are selected, so e.g. bodies
+    are not read at all when they are not encoded.
+    """
+
+    def __init__(self, fields=SNAPSHOT_FIELDS):
+        self.names = tuple(name for name, _, _ in fields)
+        self.columns = tuple(column for _, column, _ in fields)
+        self.encoders = tuple(encoder for _, _, encoder in fields)
+
+    def values(self, queryset, *extra_columns):
+        """
+        Selects the encoded columns followed by ``extra_columns``,
+        which ``encode`` ignores.
+        """
+        return queryset.values_list(*self.columns, *extra_columns)
+
+    def encode(self, row):
+        return dict(zip(
+            self.names,
+            [
+                None if value is None else encoder(value)
+                for encoder, value in zip(self.encoders, row)
+            ],
+        ))
+
+    def encode_many(self, rows):
+        return [self.encode(row) for row in rows]
+
+
+def encode_publication(publication, banners):
+    # same as BannerPublicationSerializer
+    return {
+        'id': str(publication.id),
+        'published_at': encode_datetime(publication.published_at),
+        'banners': banners,
+    }
+
+
+def dumps(data):
+    """
+    Renders JSON exactly like ``JSONRenderer`` with the default settings.
+    """
+    content = json.dumps(
+        data, ensure_ascii=False, allow_nan=False, separators=(',', ':'),
+    )
+    # keeps the output valid JavaScript, as JSONRenderer does
+    content = content.\
+        replace('\u2028', '\\u2028').\
+        replace('\u2029', '\\u2029')
+    return content.encode()
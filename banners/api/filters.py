@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db.models import Q
+from django_filters import rest_framework as filters
+
+from banners.models import BannerSnapshot
+
+
+SUPPORTED_LANGUAGES = settings.BSADMIN_SETTINGS['SUPPORTED_LANGUAGES']
+SUPPORTED_COUNTRIES = settings.BSADMIN_SETTINGS['SUPPORTED_COUNTRIES']
+
+
+def targeted_or_all(field, value):
+    """
+    Banners targeting ``value`` in ``field`` or not restricted by it
+    at all, both answered by the GIN index of the field.
+    """
+    return Q(**{field: []}) | Q(**{f'{field}__contains': [value]})
+
+
+class LiveBannerFilterSet(filters.FilterSet):
+    """
+    Filters published snapshots with containment queries, which are
+    backed by GIN indexes of the snapshot table.
+    """
+    page = filters.UUIDFilter(method='filter_page')
+    slot = filters.UUIDFilter(method='filter_slot')
+    country = filters.ChoiceFilter(
+        choices=[(country, country) for country in SUPPORTED_COUNTRIES],
+        method='filter_targeting',
+        field_name='countries',
+    )
+    language = filters.ChoiceFilter(
+        choices=[(language, language) for language in SUPPORTED_LANGUAGES],
+        method='filter_targeting',
+        field_name='languages',
+    )
+    segment = filters.CharFilter(
+        method='filter_targeting',
+        field_name='segments',
+    )
+
+    # parameters that select a subset of the stored payloads
+    SUBSET_PARAMS = ('slot', 'country', 'language', 'segment')
+
+    class Meta:
+        model = BannerSnapshot
+        fields = ()
+
+    def filter_page(self, queryset, name, value):
+        return queryset.filter(slot__contains={'page': {'id': str(value)}})
+
+    def filter_slot(self, queryset, name, value):
+        return queryset.filter(slot__contains={'id': str(value)})
+
+    def filter_targeting(self, queryset, name, value):
+        return queryset.filter(targeted_or_all(name, value))
+
+    @classmethod
+    def is_subset_request(cls, request):
+        return any(
+            request.query_params.get(param)
+            for param in cls.SUBSET_PARAMS
+        )
@@ -0,0 +1,120 @@
+import base64
+import binascii
+import json
+import uuid
+
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_snapshot_position(snapshot):
+    return snapshot.create_time, snapshot.id
+
+
+class PublicationChanged(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Live publication has changed, restart pagination.'
+    default_code = 'publication_changed'
+
+
+class PublicationCursorPagination(BasePagination):
+    """
+    Keyset pagination over snapshots of a single publication.
+
+    Pages are selected by ``(create_time, id) > cursor`` rather than
+    by offset, so every page costs the same index range scan. Cursors
+    are pinned to the publication they were issued for.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, publication=None,
+                          position=None):
+        """
+        ``position`` returns ``(create_time, id)`` of a result, by
+        default it is read from snapshot attributes.
+        """
+        self.request = request
+        self.publication = publication
+        self.position = position or get_snapshot_position
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by('create_time', 'id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            table = queryset.model._meta.db_table
+            queryset = queryset.extra(
+                where=[
+                    f'("{table}"."create_time", "{table}"."id") > (%s, %s)',
+                ],
+                params=position,
+            )
+
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit,
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            publication_id, create_time, snapshot_id = json.loads(
+                base64.urlsafe_b64decode(encoded.encode()).decode()
+            )
+            create_time = parse_datetime(create_time)
+            snapshot_id = uuid.UUID(snapshot_id)
+        except (TypeError, ValueError, AttributeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if create_time is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        if publication_id != str(self.publication.id):
+            raise PublicationChanged()
+        return create_time, str(snapshot_id)
+
+    def encode_cursor(self, item):
+        create_time, snapshot_id = self.position(item)
+        position = [
+            str(self.publication.id),
+            create_time.isoformat(),
+            str(snapshot_id),
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        result = {
+            'next': self.get_next_link(),
+        }
+        result.update(data)
+        return Response(result)
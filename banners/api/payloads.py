@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .encoders import SnapshotEncoder, dumps, encode_publication
+from banners.compression import COMPRESSORS, IDENTITY, compress
+from banners.constants import BannersPublicationState
+from banners.models import Publication, PublicationPayload
+from banners.targeting import Matcher, build_index
+
+
+logger = logging.getLogger(__name__)
+
+_live_matcher = None
+_live_matcher_lock = threading.Lock()
+
+
+def encode_banners(banners, encoder=None):
+    """
+    Serialized snapshots of the ``banners`` queryset.
+    """
+    encoder = encoder or SnapshotEncoder()
+    return encoder.encode_many(encoder.values(banners))
+
+
+def render_payload(publication, banners):
+    """
+    Renders serialized publication banners exactly as the unpaginated
+    live API does, together with their targeting index.
+    """
+    result = OrderedDict((
+        ('count', len(banners)),
+        ('next', None),
+        ('previous', None),
+    ))
+    result.update(encode_publication(publication, banners))
+    result['index'] = build_index(banners)
+    return dumps(result)
+
+
+def materialize_publication(publication):
+    """
+    Stores the full live payload of a publication together with
+    per page slices, so the API never has to serialize it again.
+    """
+    banners = encode_banners(publication.banners.all())
+
+    banners_by_page = OrderedDict()
+    for banner in banners:
+        banners_by_page.setdefault(banner['slot']['page']['id'], []).\
+            append(banner)
+
+    payloads = [
+        PublicationPayload(
+            publication=publication,
+            content=render_payload(publication, banners),
+        )
+    ]
+    for page, page_banners in banners_by_page.items():
+        payloads.append(
+            PublicationPayload(
+                publication=publication,
+                page=page,
+                content=render_payload(publication, page_banners),
+            )
+        )
+    return PublicationPayload.objects.bulk_create(payloads)
+
+
+def get_live_matcher():
+    """
+    Returns the matcher of the live publication. It is built once per
+    process from the stored payload and rebuilt only after another
+    publication went live.
+    """
+    global _live_matcher
+
+    publication_id = Publication.objects.\
+        filter(state=BannersPublicationState.STATE_LIVE.value).\
+        values_list('id', flat=True).\
+        first()
+    if publication_id is None:
+        return None
+
+    matcher = _live_matcher
+    if matcher is not None and matcher.publication_id == publication_id:
+        return matcher
+
+    with _live_matcher_lock:
+        if _live_matcher is None or \
+                _live_matcher.publication_id != publication_id:
+            _live_matcher = Matcher(
+                publication_id, load_banners(publication_id),
+            )
+        return _live_matcher
+
+
+def load_banners(publication_id):
+    content = PublicationPayload.objects.\
+        filter(
+            publication_id=publication_id,
+            page__isnull=True,
+            encoding=IDENTITY,
+        ).\
+        values_list('content', flat=True).\
+        first()
+    if content is None:
+        # published before payloads were materialized
+        publication = Publication.objects.get(id=publication_id)
+        content = render_payload(
+            publication, encode_banners(publication.banners.all()),
+        )
+    return json.loads(bytes(content))['banners']
+
+
+def lock_payload(publication, page, encoding):
+    """
+    Takes a transaction level advisory lock on a payload variant,
+    returns ``False`` when another transaction holds it.
+    """
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_try_advisory_xact_lock(hashtext(%s))',
+            [f'payload:{publication.id}:{page}:{encoding}'],
+        )
+        return cursor.fetchone()[0]
+
+
+def get_stored_content(publication, page=None, encoding=IDENTITY):
+    return publication.payloads.\
+        filter(page=page, encoding=encoding).\
+        values_list('content', flat=True).\
+        first()
+
+
+def get_payload_content(publication, page=None, encoding=IDENTITY):
+    """
+    Returns stored payload bytes in the requested content coding.
+
+    Compressed variants are stored right after publishing. A missing
+    one is compressed and stored by the first request asking for it,
+    concurrent requests get ``None`` meanwhile instead of compressing
+    the same payload again.
+    """
+    content = get_stored_content(publication, page, encoding)
+    if content is not None or encoding == IDENTITY:
+        return content
+
+    with transaction.atomic():
+        if not lock_payload(publication, page, encoding):
+            return None
+        # compressed by another request before the lock was taken
+        content = get_stored_content(publication, page, encoding)
+        if content is not None:
+            return content
+        content = get_stored_content(publication, page)
+        if content is None:
+            return None
+        content = compress(bytes(content), encoding)
+        PublicationPayload.objects.bulk_create(
+            [
+                PublicationPayload(
+                    publication=publication,
+                    page=page,
+                    encoding=encoding,
+                    content=content,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+    return content
+
+
+def compress_publication(publication):
+    """
+    Stores compressed variants of all payloads of a publication that
+    are not stored yet.
+    """
+    stored = set(
+        publication.payloads.
+        exclude(encoding=IDENTITY).
+        values_list('page', 'encoding')
+    )
+    payloads = []
+    identity_payloads = publication.payloads.\
+        filter(encoding=IDENTITY).\
+        values_list('page', 'content')
+    for page, content in identity_payloads:
+        for encoding in COMPRESSORS:
+            if (page, encoding) in stored:
+                continue
+            payloads.append(
+                PublicationPayload(
+                    publication=publication,
+                    page=page,
+                    encoding=encoding,
+                    content=compress(bytes(content), encoding),
+                )
+            )
+    return PublicationPayload.objects.bulk_create(
+        payloads, ignore_conflicts=True,
+    )
+
+
+def compress_publication_on_commit(publication):
+    def compress_payloads():
+        try:
+            compress_publication(publication)
+        except Exception:
+            # requests compress missing variants themselves
+            logger.exception(
+                'Failed to compress payloads of publication %s',
+                publication.id,
+            )
+
+    transaction.on_commit(compress_payloads)
+
+
+def prune_payloads(keep=None):
+    """
+    Deletes stored payloads of deactivated publications except the
+    ``keep`` latest ones, defaults to ``PAYLOADS_KEEP``. Their snapshots
+    logs stay, so they can still be diffed.
+    """
+    if keep is None:
+        keep = settings.BSADMIN_SETTINGS['PAYLOADS_KEEP']
+    deactivated = Publication.objects.\
+        filter(state=BannersPublicationState.STATE_DEACTIVATED.value)
+    kept = deactivated.order_by('-published_at').values('id')[:keep]
+    num_deleted, _ = PublicationPayload.objects.\
+        filter(publication__in=deactivated.values('id')).\
+        exclude(publication__in=kept).\
+        delete()
+    return num_deleted
+
+
+def prune_payloads_on_commit():
+    def prune():
+        try:
+            prune_payloads()
+        except Exception:
+            # pruned again after the next publish
+            logger.exception('Failed to prune payloads')
+
+    transaction.on_commit(prune)
@@ -0,0 +1,17 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class JSONLinesRenderer(BaseRenderer):
+    """
+    Selects the streamed JSON Lines representation with ``?format=stream``.
+    Streamed responses are written by the view, the renderer only
+    renders other responses, such as errors, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return JSONRenderer().render(data) + b'\n'
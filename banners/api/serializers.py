@@ -29,7 +29,35 @@ class BannerSnapshotModelSerializer(serializers.Serializer):
     segments = serializers.ListField()
 
 
+class PublicationSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    published_at = serializers.DateTimeField()
+
+
 class BannerPublicationSerializer(serializers.Serializer):
     id = serializers.CharField()
     published_at = serializers.DateTimeField()
     banners = BannerSnapshotModelSerializer(many=True)
+
+
+class BannerPublicationDeltaSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    published_at = serializers.DateTimeField()
+    since = serializers.CharField()
+    added = BannerSnapshotModelSerializer(many=True)
+    changed = BannerSnapshotModelSerializer(many=True)
+    removed = serializers.ListField(child=serializers.CharField())
+
+
+class PublishJobSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    state = serializers.CharField()
+    step = serializers.CharField()
+    progress = serializers.IntegerField()
+    publication = serializers.CharField(source='publication_id')
+    num_re_published = serializers.IntegerField()
+    num_newly_published = serializers.IntegerField()
+    error = serializers.CharField()
+    create_time = serializers.DateTimeField()
+    started_at = serializers.DateTimeField()
+    finished_at = serializers.DateTimeField()
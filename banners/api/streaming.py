@@ -0,0 +1,25 @@
+from django.http import StreamingHttpResponse
+
+from .encoders import SnapshotEncoder, dumps
+from .renderers import JSONLinesRenderer
+
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def stream_banners(banners, encoder=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    JSON Lines of ``banners`` read through a server side cursor, so
+    memory use does not depend on the number of banners.
+    """
+    encoder = encoder or SnapshotEncoder()
+    rows = encoder.values(banners).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dumps(encoder.encode(row)) + b'\n'
+
+
+def get_stream_response(banners, encoder=None):
+    return StreamingHttpResponse(
+        stream_banners(banners, encoder),
+        content_type=JSONLinesRenderer.media_type,
+    )
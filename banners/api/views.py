@@ -1,9 +1,34 @@
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
 
-from .serializers import BannerPublicationSerializer
-from banners.models import Publication
+from .filters import LiveBannerFilterSet
+from .pagination import PublicationCursorPagination
+from .encoders import (
+    SNAPSHOT_FIELD_NAMES, SnapshotEncoder, encode_datetime,
+    encode_publication, select_fields,
+)
+from .payloads import get_live_matcher, get_payload_content, render_payload
+from .renderers import JSONLinesRenderer
+from .serializers import PublicationSerializer, PublishJobSerializer
+from .streaming import get_stream_response
+from banners.compression import IDENTITY, negotiate_encoding
+from banners.models import Publication, PublishJob
+from banners.notifications import notifier
 
 
 def get_paginated_response(paginator, data):
@@ -16,28 +41,357 @@ def get_paginated_response(paginator, data):
     return Response(result)
 
 
+def is_paginated_request(request, paginator):
+    return (
+        paginator.limit_query_param in request.query_params or
+        paginator.offset_query_param in request.query_params
+    )
+
+
+def get_uuid_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a valid UUID.'})
+
+
+def get_list_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def is_sparse_request(request):
+    return 'fields' in request.query_params or \
+        'exclude' in request.query_params
+
+
+def get_encoder(request):
+    """
+    Encoder of the snapshot fields selected with ``?fields=`` and
+    ``?exclude=``, comma separated.
+    """
+    fields = get_list_param(request, 'fields')
+    exclude = get_list_param(request, 'exclude')
+    errors = {}
+    for name, names in (('fields', fields), ('exclude', exclude)):
+        unknown = set(names or ()).difference(SNAPSHOT_FIELD_NAMES)
+        if unknown:
+            errors[name] = 'Unknown fields: {}. Choose from: {}.'.format(
+                ', '.join(sorted(unknown)), ', '.join(SNAPSHOT_FIELD_NAMES),
+            )
+    if errors:
+        raise ValidationError(errors)
+
+    selected_fields = select_fields(fields, exclude)
+    if not selected_fields:
+        raise ValidationError({'fields': 'No fields selected.'})
+    return SnapshotEncoder(selected_fields)
+
+
+def filter_banners(request, banners):
+    filterset = LiveBannerFilterSet(
+        request.query_params, queryset=banners, request=request,
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def is_stream_request(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and \
+        renderer.format == JSONLinesRenderer.format
+
+
+def get_publication_etag(publication, encoding=IDENTITY, stream=False):
+    etag = publication.id.hex
+    if stream:
+        etag += f'-{JSONLinesRenderer.format}'
+    if encoding != IDENTITY:
+        etag += f'-{encoding}'
+    return quote_etag(etag)
+
+
 class LiveBannersView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [
+        JSONLinesRenderer,
+    ]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(LiveBannersView, self).finalize_response(
+            request, response, *args, **kwargs
+        )
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        publication = getattr(request, 'live_publication', None)
+        if publication is not None and response.status_code in (200, 304):
+            response['ETag'] = get_publication_etag(
+                publication,
+                request.content_encoding,
+                is_stream_request(request),
+            )
+        return response
 
     def get(self, request):
         live_publication = Publication.objects.get_live_publication()
         if live_publication is None:
             return Response({})
 
-        banners = live_publication.banners.all()
+        request.live_publication = live_publication
+        stream = is_stream_request(request)
+        # streams are not compressed by the application
+        request.content_encoding = IDENTITY if stream else \
+            negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        # no Last-Modified, publications made within the same second
+        # would share it
+        not_modified = get_conditional_response(
+            request,
+            etag=get_publication_etag(
+                live_publication, request.content_encoding, stream,
+            ),
+        )
+        if not_modified is not None:
+            return not_modified
+
+        if stream:
+            return get_stream_response(
+                self.get_banners(request, live_publication),
+                get_encoder(request),
+            )
+
+        page = get_uuid_param(request, 'page')
+
+        since = get_uuid_param(request, 'since')
+        if since is not None:
+            delta = self.get_delta(request, live_publication, since)
+            if delta is not None:
+                return delta
+
+        if PublicationCursorPagination.cursor_query_param in \
+                request.query_params:
+            return self.get_cursor_page(request, live_publication)
 
         paginator = LimitOffsetPagination()
-        banners_page = paginator.paginate_queryset(
-            banners, request,
+
+        if not is_paginated_request(request, paginator) and \
+                not LiveBannerFilterSet.is_subset_request(request) and \
+                not is_sparse_request(request):
+            content = get_payload_content(
+                live_publication, page, request.content_encoding,
+            )
+            if content is None and request.content_encoding != IDENTITY:
+                # another request is compressing the payload right now
+                request.content_encoding = IDENTITY
+                content = get_payload_content(live_publication, page)
+            if content is not None:
+                response = HttpResponse(
+                    bytes(content), content_type='application/json',
+                )
+                if request.content_encoding != IDENTITY:
+                    response['Content-Encoding'] = request.content_encoding
+                return response
+            if page is not None and \
+                    live_publication.payloads.filter(
+                        page__isnull=True,
+                    ).exists():
+                # no banners were published on the requested page
+                return HttpResponse(
+                    render_payload(live_publication, []),
+                    content_type='application/json',
+                )
+
+        encoder = get_encoder(request)
+        rows = encoder.values(self.get_banners(request, live_publication))
+        if not is_paginated_request(request, paginator):
+            banners = encoder.encode_many(rows)
+            if is_sparse_request(request):
+                # without the index, it needs all targeting fields
+                return Response(OrderedDict((
+                    ('count', len(banners)),
+                    ('next', None),
+                    ('previous', None),
+                    *encode_publication(live_publication, banners).items(),
+                )))
+            # all filtered banners, exactly like a stored payload
+            request.content_encoding = IDENTITY
+            return HttpResponse(
+                render_payload(live_publication, banners),
+                content_type='application/json',
+            )
+
+        rows_page = paginator.paginate_queryset(rows, request)
+        if rows_page is not None:
+            rows = rows_page
+
+        return get_paginated_response(
+            paginator,
+            encode_publication(live_publication, encoder.encode_many(rows)),
         )
-        if banners_page is not None:
-            banners = banners_page
 
-        serializer = BannerPublicationSerializer(
+    def get_banners(self, request, publication):
+        return filter_banners(request, publication.banners.all())
+
+    def get_delta(self, request, publication, since):
+        since_publication = Publication.objects.filter(id=since).first()
+        if since_publication is None or \
+                not since_publication.complete_snapshots_log:
+            return None
+
+        new_snapshots, removed_snapshots = publication.diff(
+            since_publication,
+        )
+        new_snapshots = filter_banners(request, new_snapshots)
+        removed_snapshots = filter_banners(request, removed_snapshots)
+
+        encoder = get_encoder(request)
+        added, changed = [], []
+        for row in encoder.values(new_snapshots, 'was_published'):
+            if row[-1]:
+                changed.append(encoder.encode(row))
+            else:
+                added.append(encoder.encode(row))
+
+        # same as BannerPublicationDeltaSerializer
+        return Response({
+            'id': str(publication.id),
+            'published_at': encode_datetime(publication.published_at),
+            'since': str(since_publication.id),
+            'added': added,
+            'changed': changed,
+            'removed': [
+                str(snapshot_id)
+                for snapshot_id in removed_snapshots.values_list(
+                    'id', flat=True,
+                )
+            ],
+        })
+
+    def get_cursor_page(self, request, publication):
+        paginator = PublicationCursorPagination()
+        encoder = get_encoder(request)
+        rows = paginator.paginate_queryset(
+            encoder.values(
+                self.get_banners(request, publication), 'create_time', 'id',
+            ),
+            request,
+            publication,
+            position=lambda row: row[-2:],
+        )
+        return paginator.get_paginated_response(
+            encode_publication(publication, encoder.encode_many(rows)),
+        )
+
+
+class LivePublicationChangesView(APIView):
+    """
+    Long-poll for a live publication other than ``?since=``.
+
+    Answers right away when the live publication differs, otherwise
+    blocks until ``publish`` announces a new one or ``?timeout=``
+    seconds pass and answers with 304.
+
+    Only ``LONG_POLL_MAX_WAITERS`` requests of a process block at
+    a time, so waiting consumers never take all worker threads. Other
+    ones get a 304 with ``Retry-After`` right away.
+    """
+
+    def get(self, request):
+        since = get_uuid_param(request, 'since')
+        timeout = self.get_timeout(request)
+        max_waiters = settings.BSADMIN_SETTINGS['LONG_POLL_MAX_WAITERS']
+        with notifier.waiter(max_waiters) as can_wait:
+            response = self.poll(since, timeout if can_wait else 0)
+        if not can_wait and response.status_code == 304:
+            response['Retry-After'] = \
+                settings.BSADMIN_SETTINGS['LONG_POLL_INTERVAL']
+        return response
+
+    def poll(self, since, timeout):
+        deadline = time.monotonic() + timeout
+
+        while True:
+            version = notifier.version
+            live_publication = Publication.objects.get_live_publication()
+            if live_publication is not None and \
+                    live_publication.id != since:
+                return Response(
+                    PublicationSerializer(live_publication).data
+                )
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return HttpResponseNotModified()
+            # waking up periodically covers publishes that were
+            # not announced to this process
+            notifier.wait(
+                version,
+                min(
+                    remaining,
+                    settings.BSADMIN_SETTINGS['LONG_POLL_INTERVAL'],
+                ),
+            )
+
+    def get_timeout(self, request):
+        max_timeout = settings.BSADMIN_SETTINGS['LONG_POLL_MAX_TIMEOUT']
+        timeout = request.query_params.get('timeout')
+        if not timeout:
+            return max_timeout
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            raise ValidationError({'timeout': 'Must be a number.'})
+        return min(max(timeout, 0), max_timeout)
+
+
+class ResolveBannersView(APIView):
+    """
+    Ranked banners eligible for a single page slot view, matched in
+    memory against the live publication.
+    """
+
+    def get(self, request):
+        page = get_uuid_param(request, 'page')
+        slot = get_uuid_param(request, 'slot')
+        if page is None or slot is None:
+            raise ValidationError('Both page and slot are required.')
+
+        now = request.query_params.get('now')
+        if now:
+            now = parse_datetime(now)
+            if now is None or timezone.is_naive(now):
+                raise ValidationError(
+                    {'now': 'Must be an ISO 8601 datetime with timezone.'}
+                )
+        else:
+            now = timezone.now()
+
+        matcher = get_live_matcher()
+        if matcher is None:
+            return Response({})
+
+        segments = request.query_params.get('segments', '')
+        banners = matcher.match(
+            str(page), str(slot), now,
+            country=request.query_params.get('country'),
+            language=request.query_params.get('language'),
+            segments=[segment for segment in segments.split(',') if segment],
+        )
+        return Response(
             {
-                'id': live_publication.id,
-                'published_at': live_publication.published_at,
+                'id': str(matcher.publication_id),
                 'banners': banners,
             }
         )
 
-        return get_paginated_response(paginator, serializer.data)
+
+class PublishJobView(APIView):
+    # jobs carry tracebacks of failed publishes
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request, job_id):
+        job = get_object_or_404(PublishJob, id=job_id)
+        return Response(PublishJobSerializer(job).data)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from banners.compression import COMPRESSORS, IDENTITY
+from banners.constants import BannersPublicationState
+from banners.models import Publication
+
+
+logger = logging.getLogger(__name__)
+
+CURRENT_LINK = 'current'
+MANIFEST = 'manifest.json'
+
+
+def get_artifact_name(payload):
+    if payload.page is None:
+        return 'live.json'
+    return os.path.join('pages', f'{payload.page}.json')
+
+
+def write_artifacts(publication, directory=None):
+    """
+    Writes the stored payloads of a publication, with their compressed
+    variants and a manifest, into ``<directory>/<publication id>/``
+    and points ``<directory>/current`` to it unless another publication
+    went live meanwhile. Only the latest ``ARTIFACTS_KEEP``
+    publications are kept.
+
+    Files are written into a temporary directory first, so readers
+    only ever see complete publications.
+    """
+    directory = directory or settings.BSADMIN_SETTINGS['ARTIFACTS_DIR']
+    if not directory:
+        return None
+
+    name = str(publication.id)
+    target = os.path.join(directory, name)
+    tmp_target = os.path.join(directory, f'.{name}.tmp')
+    shutil.rmtree(tmp_target, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_target, 'pages'))
+
+    # compressed variants are usually stored already
+    stored = {
+        (payload.page, payload.encoding): payload
+        for payload in publication.payloads.all()
+    }
+    files = {}
+    for (page, encoding), payload in stored.items():
+        if encoding != IDENTITY:
+            continue
+        artifact_name = get_artifact_name(payload)
+        content = bytes(payload.content)
+        files[artifact_name] = write_file(tmp_target, artifact_name, content)
+        for coding, (extension, compress) in COMPRESSORS.items():
+            compressed_name = f'{artifact_name}.{extension}'
+            compressed = stored.get((page, coding))
+            files[compressed_name] = write_file(
+                tmp_target, compressed_name,
+                compress(content) if compressed is None else
+                bytes(compressed.content),
+            )
+
+    manifest = {
+        'id': name,
+        'published_at': publication.published_at.isoformat(),
+        'files': files,
+    }
+    write_file(tmp_target, MANIFEST, json.dumps(manifest, indent=2).encode())
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp_target, target)
+
+    # publishes of other processes may commit and finish writing
+    # in any order, only the live publication becomes current
+    with transaction.atomic():
+        lock_artifacts(directory)
+        current_link = os.path.join(directory, CURRENT_LINK)
+        if Publication.objects.filter(
+            id=publication.id,
+            state=BannersPublicationState.STATE_LIVE.value,
+        ).exists():
+            tmp_link = os.path.join(directory, f'.{CURRENT_LINK}.{name}.tmp')
+            if os.path.lexists(tmp_link):
+                os.remove(tmp_link)
+            os.symlink(name, tmp_link)
+            os.replace(tmp_link, current_link)
+        else:
+            logger.info(
+                'Publication %s is not live anymore, not made current',
+                publication.id,
+            )
+
+        prune_artifacts(
+            directory, settings.BSADMIN_SETTINGS['ARTIFACTS_KEEP'],
+            os.readlink(current_link) if os.path.lexists(current_link)
+            else None,
+        )
+    return target
+
+
+def lock_artifacts(directory):
+    """
+    Waits for the transaction level advisory lock of an artifacts
+    directory.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(hashtext(%s))',
+            [f'artifacts:{os.path.abspath(directory)}'],
+        )
+
+
+def prune_artifacts(directory, keep, current):
+    """
+    Removes publication directories except the ``keep`` most recently
+    written ones and the ``current`` one.
+    """
+    publications = []
+    for entry in os.scandir(directory):
+        try:
+            uuid.UUID(entry.name)
+        except ValueError:
+            # not a publication directory
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            publications.append((entry.stat().st_mtime, entry.name))
+
+    publications.sort(reverse=True)
+    removed = []
+    for _, name in publications[keep:]:
+        if name == current:
+            continue
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        removed.append(name)
+    return removed
+
+
+def write_file(directory, name, content):
+    with open(os.path.join(directory, name), 'wb') as artifact:
+        artifact.write(content)
+    return {
+        'size': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+    }
+
+
+def write_artifacts_on_commit(publication):
+    def write():
+        try:
+            write_artifacts(publication)
+        except Exception:
+            # the publication is live anyway, artifacts can be rewritten
+            logger.exception(
+                'Failed to write artifacts of publication %s', publication.id,
+            )
+
+    transaction.on_commit(write)
@@ -1,38 +1,155 @@
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
 
+from banners.api.payloads import (
+    compress_publication_on_commit, materialize_publication,
+    prune_payloads_on_commit,
+)
+from banners.artifacts import write_artifacts_on_commit
 from banners.constants import BannersPublicationState
-from banners.models import Publication, Banner
+from banners.metrics import PublishTimer, QueryCounter
+from banners.models import Publication, Banner, BannerChange, BannerSnapshot
+from banners.notifications import announce_publication
+
+
+def publish(publisher, progress=None, full=False, banners=None):
+    _, num_re_published, num_newly_published = publish_publication(
+        publisher, progress=progress, full=full, banners=banners,
+    )
+    return num_re_published, num_newly_published
+
+
+def report_nothing(step, percent):
+    pass
 
 
 @transaction.atomic
-def publish(publisher):
-    now = timezone.now()
+def publish_publication(publisher, progress=None, full=False,
+                        banners=None):
+    """
+    Makes a new live publication of all publishable banners and
+    records its build statistics.
+
+    Only banners journaled as changed are published again, snapshots
+    of the other ones are carried forward from the live publication.
+    ``full`` republishes all banners instead.
 
-    live_publication = Publication.objects.\
-        select_for_update().\
-        get_live_publication()
+    When a ``banners`` queryset is given, only these banners are
+    published again and changes of all other banners stay pending.
 
-    if live_publication is not None:
-        live_publication.state = BannersPublicationState.STATE_DEACTIVATED.value
-        live_publication.save()
+    ``progress`` is called with a step description and the percent
+    done before every step.
+    """
+    timer = PublishTimer()
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        new_publication, num_re_published, num_newly_published, payloads = \
+            build_publication(
+                publisher, progress or report_nothing, timer,
+                full=full, banners=banners,
+            )
 
-    new_publication = Publication.objects.create(
-        state=BannersPublicationState.STATE_LIVE.value,
-        published_by=publisher,
-        published_at=now,
+    new_publication.build_duration = timer.duration
+    new_publication.build_phases = list(timer.phases.items())
+    new_publication.num_re_published = num_re_published
+    new_publication.num_newly_published = num_newly_published
+    new_publication.payload_size = sum(
+        len(payload.content) for payload in payloads
+        if payload.page is None
     )
+    new_publication.num_queries = queries.count
+    new_publication.save(update_fields=Publication.BUILD_STATS_FIELDS)
+
+    announce_publication(new_publication)
+    # artifacts reuse the compressed payloads
+    compress_publication_on_commit(new_publication)
+    write_artifacts_on_commit(new_publication)
+    prune_payloads_on_commit()
+    timer.observe_on_commit(num_re_published, num_newly_published)
+
+    return new_publication, num_re_published, num_newly_published
+
+
+def build_publication(publisher, progress, timer, full=False,
+                      banners=None):
+    now = timezone.now()
+
+    progress('Deactivating live publication', 0)
+    with timer.phase('deactivate'):
+        live_publication = Publication.objects.\
+            select_for_update().\
+            get_live_publication()
+
+        if live_publication is not None:
+            live_publication.state = \
+                BannersPublicationState.STATE_DEACTIVATED.value
+            live_publication.save()
+
+        new_publication = Publication.objects.create(
+            state=BannersPublicationState.STATE_LIVE.value,
+            published_by=publisher,
+            published_at=now,
+            complete_snapshots_log=True,
+        )
+
+    progress('Collecting changed banners', 5)
+    with timer.phase('collect_changes'):
+        changes = BannerChange.objects.all()
+        if banners is None:
+            # deactivated banners included, so they are not carried forward
+            changed_ids = new_publication.changes.values('banner_id')
+        else:
+            changed_ids = banners.order_by().values('id')
+            changes = changes.filter(banner__in=changed_ids)
+        changes.claim(new_publication)
+        changed_banners = Banner.objects.filter(id__in=changed_ids)
+        # slot and page changes are only journaled, not hashed
+        changed_banners.rehash()
+
+    if banners is None and (full or live_publication is None):
+        banners = Banner.objects.all()
+        num_carried_forward = 0
+        # changes made with update() or bulk_update() are not hashed
+        with timer.phase('rehash'):
+            banners.rehash()
+    else:
+        carried_forward = BannerSnapshot.objects.\
+            filter(publication=live_publication)
+        if banners is None:
+            # banners deactivated or hidden without a journal entry,
+            # e.g. before the journal existed, are not carried forward.
+            # Selected publishes keep all other banners as they are.
+            carried_forward = carried_forward.filter(
+                original_banner__active=True,
+                original_banner__slot__hidden=False,
+            )
+        banners = changed_banners
+        num_carried_forward = 0
+        if live_publication is not None:
+            with timer.phase('carry_forward'):
+                num_carried_forward = carried_forward.\
+                    exclude(original_banner__in=changed_ids).\
+                    update(publication=new_publication)
 
     # making banners snapshots to display
-    num_re_published, num_newly_published = Banner.objects.\
+    progress('Publishing banners snapshots', 10)
+    num_re_published, num_newly_published = banners.\
         publishable_banners().\
-        republish_snapshots(new_publication)
+        republish_snapshots(new_publication, timer=timer)
+    num_re_published += num_carried_forward
 
     # marking as published
-    Banner.objects.publishable_banners().\
-        update(
-            update_time=now,
-            published_at=now,
-    )
+    progress('Marking banners as published', 60)
+    with timer.phase('mark_published'):
+        banners.publishable_banners().\
+            update(
+                update_time=now,
+                published_at=now,
+        )
 
-    return num_re_published, num_newly_published
+    # serializing once, the live API only serves stored payloads
+    progress('Materializing payloads', 70)
+    with timer.phase('materialize'):
+        payloads = materialize_publication(new_publication)
+
+    return new_publication, num_re_published, num_newly_published, payloads
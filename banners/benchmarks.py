@@ -0,0 +1,317 @@
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from banners.api.payloads import compress_publication, prune_payloads
+from banners.api.views import LiveBannersView
+from banners.artifacts import write_artifacts
+from banners.backend import publish_publication
+from banners.constants import BannerChangeReason, BannersPublicationState
+from banners.hashing import BannerHasher
+from banners.models import (
+    Banner, BannerBody, BannerChange, Page, Publication, Slot,
+)
+
+
+SUPPORTED_LANGUAGES = settings.BSADMIN_SETTINGS['SUPPORTED_LANGUAGES']
+SUPPORTED_COUNTRIES = settings.BSADMIN_SETTINGS['SUPPORTED_COUNTRIES']
+
+SEGMENTS = tuple(f'segment-{i}' for i in range(20))
+WORDS = (
+    'sale', 'new', 'offer', 'free', 'shipping', 'today', 'only', 'best',
+    'price', 'deal', 'limited', 'time', 'members', 'exclusive', 'now',
+)
+
+
+class Size(object):
+    """
+    Catalog of ``pages`` pages with ``slots`` slots each and
+    ``banners`` banners in every slot.
+    """
+
+    def __init__(self, pages, slots, banners):
+        self.pages = pages
+        self.slots = slots
+        self.banners = banners
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Parses sizes written as ``<pages>x<slots>x<banners>``.
+        """
+        try:
+            pages, slots, banners = (int(part) for part in value.split('x'))
+        except ValueError:
+            raise ValueError(
+                f'Size must look like <pages>x<slots>x<banners>, '
+                f'got {value!r}'
+            )
+        return cls(pages, slots, banners)
+
+    @property
+    def num_banners(self):
+        return self.pages * self.slots * self.banners
+
+    def __str__(self):
+        return f'{self.pages}x{self.slots}x{self.banners}'
+
+
+DEFAULT_SIZES = (
+    Size(2, 5, 10),
+    Size(5, 10, 20),
+    Size(10, 20, 50),
+)
+
+
+class CatalogGenerator(object):
+    """
+    Creates a synthetic catalog with bodies of a few kilobytes and
+    randomly filled targeting arrays. The same seed always gives
+    the same catalog.
+    """
+    body_paragraphs = (2, 12)
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def body(self):
+        paragraphs = ''.join(
+            f'<p class="banner-text">{self.sentence(40)}</p>'
+            for _ in range(self.random.randint(*self.body_paragraphs))
+        )
+        return (
+            f'<div class="banner">'
+            f'<h2>{self.sentence(5)}</h2>{paragraphs}'
+            f'<a href="https://example.com/{self.random.getrandbits(32)}">'
+            f'{self.sentence(2)}</a></div>'
+        )
+
+    def sample(self, values):
+        return self.random.sample(values, self.random.randint(0, len(values)))
+
+    def generate(self, size, prefix='benchmark'):
+        pages = Page.objects.bulk_create(
+            Page(name=f'{prefix} page {i}', description=self.sentence(10))
+            for i in range(size.pages)
+        )
+        slots = Slot.objects.bulk_create(
+            Slot(
+                name=f'{prefix} slot {page_number}-{i}',
+                description=self.sentence(10),
+                page=page,
+            )
+            for page_number, page in enumerate(pages)
+            for i in range(size.slots)
+        )
+
+        now = timezone.now()
+        banners = []
+        for slot in slots:
+            for i in range(size.banners):
+                banner = Banner(
+                    name=f'{slot.name} banner {i}',
+                    slot=slot,
+                    priority=self.random.randint(0, 100),
+                    countries=self.sample(SUPPORTED_COUNTRIES),
+                    languages=self.sample(SUPPORTED_LANGUAGES),
+                    segments=self.sample(SEGMENTS),
+                    dismissible=self.random.random() < 0.5,
+                    start_time=now - timezone.timedelta(days=1),
+                    end_time=(
+                        now + timezone.timedelta(days=30)
+                        if self.random.random() < 0.5 else None
+                    ),
+                )
+                banner.body = self.body()
+                banners.append(banner)
+
+        BannerBody.objects.store(*(banner.body_content for banner in banners))
+        hashes = BannerHasher().hash_many(banners)
+        for banner, banner_hash in zip(banners, hashes):
+            banner.content_hash = banner_hash
+        banners = Banner.objects.bulk_create(banners, batch_size=1000)
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_SAVED.value,
+            slot__in=slots,
+        )
+        return banners
+
+    def change(self, banners, share):
+        """
+        Changes the body of a ``share`` of ``banners``, so they need
+        new snapshots on the next publish.
+        """
+        changed = self.random.sample(banners, int(len(banners) * share))
+        for banner in changed:
+            banner.body = self.body()
+        BannerBody.objects.store(*(banner.body_content for banner in changed))
+        Banner.objects.bulk_update(changed, ['body_content'], batch_size=1000)
+        Banner.objects.filter(id__in=[banner.id for banner in changed]).\
+            rehash()
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_SAVED.value,
+            id__in=[banner.id for banner in changed],
+        )
+        return changed
+
+
+@contextmanager
+def measure(results, name, trace_memory=False):
+    """
+    Records wall time and number of queries of the block under
+    ``results[name]``, or only its peak Python memory with
+    ``trace_memory``, as tracing allocations slows the block down.
+    """
+    result = results.setdefault(name, OrderedDict())
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            yield
+            _, result['peak_memory_bytes'] = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return
+
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - started
+    result['seconds'] = round(seconds, 6)
+    result['queries'] = len(queries)
+
+
+def is_empty_database():
+    """
+    Benchmarks publish for real, so they must not run next to
+    a catalog: the live publication would stay locked for the whole
+    run and the existing banners would skew the results.
+    """
+    return not any(
+        model._base_manager.exists()
+        for model in (Page, Slot, Banner, Publication)
+    )
+
+
+def get_live_banners(query=None):
+    request = RequestFactory(HTTP_HOST='localhost').get('/', query or {})
+    response = LiveBannersView.as_view()(request)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+class Rollback(Exception):
+    pass
+
+
+def publish_now(publisher, artifacts_dir):
+    """
+    Publishes and runs the work ``publish`` defers until commit,
+    which never happens for rolled back benchmark data.
+    """
+    publication, _, _ = publish_publication(publisher)
+    compress_publication(publication)
+    write_artifacts(publication, artifacts_dir)
+    prune_payloads()
+    return publication
+
+
+def benchmark_size(size, publisher, seed=0, changed_share=0.1):
+    """
+    Benchmarks publishing and reading a catalog of the given size.
+
+    The benchmark runs twice on the same generated data, first timed
+    and then with memory tracing. All data is created in transactions
+    that are rolled back.
+    """
+    results = OrderedDict()
+    for trace_memory in (False, True):
+        run_benchmark(
+            results, size, publisher, seed, changed_share, trace_memory,
+        )
+
+    return OrderedDict((
+        ('size', str(size)),
+        ('pages', size.pages),
+        ('slots', size.pages * size.slots),
+        ('banners', size.num_banners),
+        ('results', results),
+    ))
+
+
+def run_benchmark(results, size, publisher, seed, changed_share,
+                  trace_memory):
+    """
+    A single rolled back benchmark pass, see ``measure``.
+    """
+    generator = CatalogGenerator(seed)
+    try:
+        with tempfile.TemporaryDirectory() as artifacts_dir, \
+                transaction.atomic():
+            with measure(results, 'generate', trace_memory):
+                banners = generator.generate(size)
+
+            with measure(results, 'publish_initial', trace_memory):
+                publish_now(publisher, artifacts_dir)
+
+            with measure(results, 'live_full', trace_memory):
+                get_live_banners()
+            with measure(results, 'live_page', trace_memory):
+                get_live_banners({'page': str(banners[0].slot.page_id)})
+            with measure(results, 'live_limit_offset', trace_memory):
+                get_live_banners({'limit': 100, 'offset': 0})
+            with measure(results, 'live_cursor', trace_memory):
+                get_live_banners({'cursor': '', 'limit': 100})
+
+            generator.change(banners, changed_share)
+            with measure(results, 'publish_changed', trace_memory):
+                publish_now(publisher, artifacts_dir)
+
+            with measure(results, 'publish_unchanged', trace_memory):
+                publish_now(publisher, artifacts_dir)
+
+            generator.change(banners, changed_share)
+            publication = Publication.objects.create(
+                state=BannersPublicationState.STATE_DEACTIVATED.value,
+                published_by=publisher,
+                published_at=timezone.now(),
+            )
+            with measure(results, 'republish_snapshots', trace_memory):
+                Banner.objects.\
+                    publishable_banners().\
+                    republish_snapshots(publication)
+
+            with measure(results, 'duplicate', trace_memory):
+                Banner.objects.filter(slot__page=banners[0].slot.page).\
+                    duplicate()
+
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def run_benchmarks(sizes, publisher, seed=0):
+    return OrderedDict((
+        ('created_at', timezone.now().isoformat()),
+        ('python', platform.python_version()),
+        ('django', django.get_version()),
+        ('database', connection.vendor),
+        ('seed', seed),
+        ('benchmarks', [
+            benchmark_size(size, publisher, seed=seed) for size in sizes
+        ]),
+    ))
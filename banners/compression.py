@@ -0,0 +1,73 @@
+import gzip
+import io
+from collections import OrderedDict
+
+import brotli
+import zstandard
+
+
+# levels compress multi megabyte payloads in well under a second,
+# the highest ones take seconds and barely save more
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+ZSTD_LEVEL = 9
+
+
+def gzip_compress(content):
+    buffer = io.BytesIO()
+    # fixed mtime keeps the output stable for the same content
+    with gzip.GzipFile(
+        fileobj=buffer, mode='wb', mtime=0, compresslevel=GZIP_LEVEL,
+    ) as gzip_file:
+        gzip_file.write(content)
+    return buffer.getvalue()
+
+
+def brotli_compress(content):
+    return brotli.compress(
+        content, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY,
+    )
+
+
+def zstd_compress(content):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+
+
+IDENTITY = 'identity'
+
+# content coding -> (file extension, compressor), in order of preference
+COMPRESSORS = OrderedDict((
+    ('br', ('br', brotli_compress)),
+    ('zstd', ('zst', zstd_compress)),
+    ('gzip', ('gz', gzip_compress)),
+))
+
+
+def compress(content, encoding):
+    return COMPRESSORS[encoding][1](content)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Picks the supported content coding with the highest quality in
+    an ``Accept-Encoding`` header, preferring better compression
+    on ties.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        coding, _, params = coding.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        qualities[coding.strip().lower()] = quality
+
+    best_encoding, best_quality = IDENTITY, 0
+    for encoding in COMPRESSORS:
+        quality = qualities.get(encoding, qualities.get('*', 0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
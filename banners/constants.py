@@ -4,3 +4,18 @@ from enum import Enum
 class BannersPublicationState(Enum):
     STATE_DEACTIVATED = 'deactivated'
     STATE_LIVE = 'live'
+
+
+class PublishJobState(Enum):
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+
+
+class BannerChangeReason(Enum):
+    REASON_SAVED = 'saved'
+    REASON_DEACTIVATED = 'deactivated'
+    REASON_DUPLICATED = 'duplicated'
+    REASON_SLOT_CHANGED = 'slot_changed'
+    REASON_PAGE_CHANGED = 'page_changed'
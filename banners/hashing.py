@@ -0,0 +1,92 @@
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+DIGEST_SIZE = 32
+
+
+def encode(value):
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+def encode_copy(copy, encoded=None):
+    """
+    Encodes a dict exactly like ``encode`` does, but takes already
+    encoded JSON for the keys found in ``encoded``.
+    """
+    encoded = encoded or {}
+    return '{%s}' % ', '.join(
+        '%s: %s' % (
+            encode(key),
+            encoded[key] if key in encoded else encode(value),
+        )
+        for key, value in copy.items()
+    )
+
+
+def digest(text):
+    return hashlib.blake2b(
+        text.encode(), digest_size=DIGEST_SIZE,
+    ).hexdigest()
+
+
+def hash_copy(copy, encoded=None):
+    """
+    Fixed size content digest of the canonical JSON encoding.
+    """
+    return digest(encode_copy(copy, encoded))
+
+
+def _hash_copy(args):
+    return hash_copy(*args)
+
+
+class BannerHasher(object):
+    """
+    Computes ``Banner.get_hash`` for many banners at once.
+
+    Slots and pages are encoded once per hasher instead of once per
+    banner, and banners are expected to come with ``slot__page``
+    already selected.
+    """
+    chunksize = 500
+
+    def __init__(self):
+        self.pages = {}
+        self.slots = {}
+
+    def encode_page(self, page):
+        if page.id not in self.pages:
+            self.pages[page.id] = encode(page.to_dict())
+        return self.pages[page.id]
+
+    def encode_slot(self, slot):
+        if slot.id not in self.slots:
+            self.slots[slot.id] = encode_copy(
+                dict(slot.to_dict(), page=None),
+                {'page': self.encode_page(slot.page)},
+            )
+        return self.slots[slot.id]
+
+    def hash_many(self, banners, workers=None):
+        """
+        Returns hashes in the order of ``banners``, spreading the
+        encoding over ``workers`` processes when given.
+        """
+        copies = [
+            (
+                dict(banner.to_copy(), slot=None),
+                {'slot': self.encode_slot(banner.slot)},
+            )
+            for banner in banners
+        ]
+        if not workers:
+            return [_hash_copy(copy) for copy in copies]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(
+                pool.map(_hash_copy, copies, chunksize=self.chunksize)
+            )
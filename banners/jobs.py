@@ -0,0 +1,191 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from banners.backend import publish_publication
+from banners.constants import PublishJobState
+from banners.models import PublishJob
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPublishWorker(object):
+    """
+    Runs publish jobs one by one in a background thread of the
+    current process, so no external queue is needed.
+
+    Progress is written through a separate thread with its own
+    database connection, otherwise it would only become visible when
+    the publish transaction commits.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='publish',
+        )
+        self.reporter = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='publish-progress',
+        )
+        self.started = False
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        transaction.on_commit(lambda: self.start().submit(self.run, job.id))
+
+    def start(self):
+        """
+        Returns the executor, failing stale jobs of dead workers first
+        when it is used for the first time.
+        """
+        with self.lock:
+            if not self.started:
+                self.started = True
+                self.executor.submit(self.fail_stale_jobs)
+        return self.executor
+
+    def fail_stale_jobs(self):
+        """
+        Marks as failed running jobs no live worker holds the lock of,
+        and queued jobs that did not start within
+        ``PUBLISH_JOB_QUEUED_TIMEOUT`` seconds.
+        """
+        try:
+            queued_before = timezone.now() - timezone.timedelta(
+                seconds=settings.BSADMIN_SETTINGS[
+                    'PUBLISH_JOB_QUEUED_TIMEOUT'
+                ],
+            )
+            stale_ids = list(
+                PublishJob.objects.filter(
+                    state=PublishJobState.STATE_QUEUED.value,
+                    create_time__lt=queued_before,
+                ).values_list('id', flat=True)
+            )
+            running_ids = PublishJob.objects.\
+                filter(state=PublishJobState.STATE_RUNNING.value).\
+                values_list('id', flat=True)
+            for job_id in running_ids:
+                if lock_job(job_id):
+                    unlock_job(job_id)
+                    stale_ids.append(job_id)
+
+            num_failed = PublishJob.objects.\
+                filter(
+                    id__in=stale_ids,
+                    state__in=(
+                        PublishJobState.STATE_QUEUED.value,
+                        PublishJobState.STATE_RUNNING.value,
+                    ),
+                ).\
+                update(
+                    state=PublishJobState.STATE_FAILED.value,
+                    error='The worker running the job stopped',
+                    finished_at=timezone.now(),
+                )
+            if num_failed:
+                logger.warning(
+                    'Marked %s stale publish jobs as failed', num_failed,
+                )
+            return num_failed
+        except Exception:
+            logger.exception('Failed to mark stale publish jobs failed')
+        finally:
+            connection.close()
+
+    def run(self, job_id):
+        jobs = PublishJob.objects.filter(id=job_id)
+        try:
+            # held until the connection is closed, also when
+            # the process dies
+            lock_job(job_id)
+            jobs.update(
+                state=PublishJobState.STATE_RUNNING.value,
+                started_at=timezone.now(),
+            )
+            job = jobs.select_related('created_by').get()
+
+            def progress(step, percent):
+                self.report(job_id, step=step, progress=percent)
+
+            publication, num_re_published, num_newly_published = \
+                publish_publication(
+                    job.created_by,
+                    progress=progress,
+                    banners=job.get_banners(),
+                )
+            jobs.update(
+                state=PublishJobState.STATE_DONE.value,
+                step='',
+                progress=100,
+                publication=publication,
+                num_re_published=num_re_published,
+                num_newly_published=num_newly_published,
+                finished_at=timezone.now(),
+            )
+        except Exception:
+            logger.exception('Publish job %s failed', job_id)
+            jobs.update(
+                state=PublishJobState.STATE_FAILED.value,
+                error=traceback.format_exc(),
+                finished_at=timezone.now(),
+            )
+        finally:
+            connection.close()
+
+    def report(self, job_id, **fields):
+        self.reporter.submit(self.write_report, job_id, fields).result()
+
+    @staticmethod
+    def write_report(job_id, fields):
+        try:
+            PublishJob.objects.filter(id=job_id).update(**fields)
+        finally:
+            connection.close()
+
+
+def get_job_lock_key(job_id):
+    return f'publish-job:{job_id}'
+
+
+def lock_job(job_id):
+    """
+    Takes the session level advisory lock of a running job, returns
+    ``False`` when another connection holds it.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_try_advisory_lock(hashtext(%s))',
+            [get_job_lock_key(job_id)],
+        )
+        return cursor.fetchone()[0]
+
+
+def unlock_job(job_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_unlock(hashtext(%s))',
+            [get_job_lock_key(job_id)],
+        )
+
+
+worker = LocalPublishWorker()
+
+
+def enqueue_publish(publisher, banners=None):
+    """
+    Creates a publish job that starts once the current transaction
+    commits. Only ``banners`` are published when given.
+    """
+    job = PublishJob.objects.create(created_by=publisher)
+    if banners is not None:
+        job.banners.set(banners)
+    worker.submit(job)
+    return job
@@ -0,0 +1,74 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from banners.benchmarks import (
+    DEFAULT_SIZES, Size, is_empty_database, run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks publishing and the live API on synthetic catalogs, '
+        'all benchmark data is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            action='append',
+            dest='sizes',
+            help=(
+                'Catalog size as <pages>x<slots>x<banners>, can be repeated. '
+                'Defaults to ' +
+                ', '.join(str(size) for size in DEFAULT_SIZES)
+            ),
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='JSON file to write results to',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--publisher',
+            help='Username to publish as, defaults to the first superuser',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [Size.parse(size) for size in options['sizes'] or []]
+        except ValueError as e:
+            raise CommandError(e)
+
+        if not is_empty_database():
+            raise CommandError(
+                'Benchmarks need a database without pages, slots, banners '
+                'and publications, e.g. a fresh one with only a user'
+            )
+
+        users = get_user_model().objects.order_by('pk')
+        if options['publisher']:
+            publisher = users.filter(username=options['publisher']).first()
+        else:
+            publisher = users.filter(is_superuser=True).first()
+        if publisher is None:
+            raise CommandError('There is no user to publish as')
+
+        report = run_benchmarks(
+            sizes or DEFAULT_SIZES, publisher, seed=options['seed'],
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for benchmark in report['benchmarks']:
+            self.stdout.write(f'{benchmark["size"]} '
+                              f'({benchmark["banners"]} banners)')
+            for name, result in benchmark['results'].items():
+                self.stdout.write(
+                    f'  {name:<22} {result["seconds"]:>10.3f}s '
+                    f'{result["queries"]:>6} queries '
+                    f'{result["peak_memory_bytes"] / 2 ** 20:>8.1f} MiB'
+                )
+        self.stdout.write(f'Results written to {options["output"]}')
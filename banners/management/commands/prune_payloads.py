@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from banners.api.payloads import prune_payloads
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored payloads of old deactivated publications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep', type=int,
+            help='Deactivated publications to keep payloads of, '
+                 'defaults to BSADMIN_PAYLOADS_KEEP',
+        )
+
+    def handle(self, *args, **options):
+        num_deleted = prune_payloads(options['keep'])
+        self.stdout.write(f'{num_deleted} payloads deleted')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banners.artifacts import write_artifacts
+from banners.models import Publication
+
+
+class Command(BaseCommand):
+    help = 'Writes static artifacts of the live publication'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            help='Target directory, defaults to BSADMIN_ARTIFACTS_DIR',
+        )
+
+    def handle(self, *args, **options):
+        publication = Publication.objects.get_live_publication()
+        if publication is None:
+            raise CommandError('There is no live publication')
+
+        target = write_artifacts(publication, options['directory'])
+        if target is None:
+            raise CommandError('Artifacts directory is not configured')
+        self.stdout.write(f'Artifacts written to {target}')
@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.http import HttpResponse
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = tuple(2 ** power for power in range(10, 25, 2))
+PUBLISH_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def escape_label(value):
+    return str(value).\
+        replace('\\', '\\\\').\
+        replace('\n', '\\n').\
+        replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        f'{name}="{escape_label(value)}"' for name, value in labels
+    )
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_key(self, labels):
+        return tuple(
+            (name, labels[name]) for name in self.label_names
+        )
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.extend(self.render_value(key, value))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render_value(self, key, value):
+        yield f'{self.name}{format_labels(key)} {format_value(value)}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'), )
+
+    def observe(self, value, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0]
+            counts, _ = self.values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key][1] += value
+
+    def render_value(self, key, value):
+        counts, total = value
+        for bound, count in zip(self.buckets, counts):
+            labels = key + (('le', format_value(bound)), )
+            yield f'{self.name}_bucket{format_labels(labels)} {count}'
+        yield f'{self.name}_sum{format_labels(key)} {format_value(total)}'
+        yield f'{self.name}_count{format_labels(key)} {counts[-1]}'
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'bsadmin_http_request_duration_seconds',
+    'Time spent answering HTTP requests',
+    labels=('view', 'method', 'status'),
+))
+request_db_queries = registry.register(Histogram(
+    'bsadmin_http_request_db_queries',
+    'Database queries made per HTTP request',
+    labels=('view', ),
+    buckets=QUERIES_BUCKETS,
+))
+request_db_duration = registry.register(Histogram(
+    'bsadmin_http_request_db_duration_seconds',
+    'Time spent in database queries per HTTP request',
+    labels=('view', ),
+))
+response_size = registry.register(Histogram(
+    'bsadmin_http_response_size_bytes',
+    'Size of HTTP response bodies',
+    labels=('view', ),
+    buckets=BYTES_BUCKETS,
+))
+publish_duration = registry.register(Histogram(
+    'bsadmin_publish_duration_seconds',
+    'Time spent publishing',
+    buckets=PUBLISH_BUCKETS,
+))
+publish_phase_duration = registry.register(Histogram(
+    'bsadmin_publish_phase_duration_seconds',
+    'Time spent in every phase of publishing',
+    labels=('phase', ),
+    buckets=PUBLISH_BUCKETS,
+))
+published_snapshots = registry.register(Counter(
+    'bsadmin_published_snapshots_total',
+    'Snapshots published, reused from previous publications or created',
+    labels=('kind', ),
+))
+
+
+class QueryCounter(object):
+    """
+    ``execute_wrapper`` counting queries and the time spent in them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    if match.url_name:
+        return match.view_name
+    view = getattr(match.func, 'view_class', match.func)
+    return view.__name__
+
+
+class MetricsMiddleware(object):
+    """
+    Observes latency, database usage and response size of every
+    request, labelled by view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = get_view_name(request)
+        request_duration.observe(
+            duration,
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        request_db_queries.observe(queries.count, view=view)
+        request_db_duration.observe(queries.duration, view=view)
+        if not response.streaming:
+            response_size.observe(len(response.content), view=view)
+        return response
+
+
+class PublishTimer(object):
+    """
+    Measures phases of a publish, the durations are kept in
+    ``phases`` in the order the phases ran.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + \
+                time.perf_counter() - started
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    def observe_on_commit(self, num_re_published, num_newly_published):
+        duration = self.duration
+        phases = list(self.phases.items())
+
+        def observe():
+            publish_duration.observe(duration)
+            for phase, phase_duration in phases:
+                publish_phase_duration.observe(phase_duration, phase=phase)
+            published_snapshots.inc(num_re_published, kind='reused')
+            published_snapshots.inc(num_newly_published, kind='created')
+
+        transaction.on_commit(observe)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationPayload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('page', models.UUIDField(blank=True, null=True)),
+                ('content', models.BinaryField()),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payloads', to='banners.Publication')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='publicationpayload',
+            constraint=models.UniqueConstraint(fields=('publication', 'page'), name='unique_publication_page_payload'),
+        ),
+        migrations.AddConstraint(
+            model_name='publicationpayload',
+            constraint=models.UniqueConstraint(condition=models.Q(page__isnull=True), fields=('publication',), name='unique_publication_full_payload'),
+        ),
+    ]
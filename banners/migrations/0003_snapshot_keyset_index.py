@@ -0,0 +1,17 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0002_publication_payload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=models.Index(fields=['publication', 'create_time', 'id'], name='snapshot_publication_keyset'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import base64
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_base64_to_content_hash(hash_base64):
+    # hashes were stored as str() of the base64 encoded bytes
+    if hash_base64.startswith("b'") and hash_base64.endswith("'"):
+        hash_base64 = hash_base64[2:-1]
+    return hashlib.blake2b(
+        base64.b64decode(hash_base64), digest_size=32,
+    ).hexdigest()
+
+
+def fill_content_hash(apps, schema_editor):
+    batch_size = 1000
+    for model_name in ('Banner', 'BannerSnapshot'):
+        model = apps.get_model('banners', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'hash_base64').\
+                iterator(chunk_size=batch_size):
+            obj.content_hash = hash_base64_to_content_hash(obj.hash_base64)
+            batch.append(obj)
+            if len(batch) == batch_size:
+                model.objects.bulk_update(batch, ['content_hash'])
+                batch = []
+        model.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0003_snapshot_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banner',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='bannersnapshot',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_content_hash),
+        migrations.AlterField(
+            model_name='banner',
+            name='content_hash',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='bannersnapshot',
+            name='content_hash',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.RemoveField(
+            model_name='banner',
+            name='hash_base64',
+        ),
+        migrations.RemoveField(
+            model_name='bannersnapshot',
+            name='hash_base64',
+        ),
+    ]
@@ -0,0 +1,80 @@
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def store_bodies(apps, schema_editor):
+    BannerBody = apps.get_model('banners', 'BannerBody')
+    batch_size = 1000
+    for model_name in ('Banner', 'BannerSnapshot'):
+        model = apps.get_model('banners', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'body').\
+                iterator(chunk_size=batch_size):
+            obj.body_content_id = hashlib.blake2b(
+                obj.body.encode(), digest_size=32,
+            ).hexdigest()
+            batch.append(obj)
+            if len(batch) == batch_size:
+                store_batch(BannerBody, model, batch)
+                batch = []
+        store_batch(BannerBody, model, batch)
+
+
+def store_batch(BannerBody, model, batch):
+    BannerBody.objects.bulk_create(
+        [
+            BannerBody(digest=obj.body_content_id, content=obj.body)
+            for obj in batch
+        ],
+        ignore_conflicts=True,
+    )
+    model.objects.bulk_update(batch, ['body_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0004_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannerBody',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='banner',
+            name='body_content',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banners.BannerBody'),
+        ),
+        migrations.AddField(
+            model_name='bannersnapshot',
+            name='body_content',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banners.BannerBody'),
+        ),
+        migrations.RunPython(store_bodies),
+        migrations.AlterField(
+            model_name='banner',
+            name='body_content',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banners.BannerBody'),
+        ),
+        migrations.AlterField(
+            model_name='bannersnapshot',
+            name='body_content',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banners.BannerBody'),
+        ),
+        migrations.RemoveField(
+            model_name='banner',
+            name='body',
+        ),
+        migrations.RemoveField(
+            model_name='bannersnapshot',
+            name='body',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0005_banner_body'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='publicationpayload',
+            name='unique_publication_page_payload',
+        ),
+        migrations.RemoveConstraint(
+            model_name='publicationpayload',
+            name='unique_publication_full_payload',
+        ),
+        migrations.AddField(
+            model_name='publicationpayload',
+            name='encoding',
+            field=models.CharField(default='identity', max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='publicationpayload',
+            constraint=models.UniqueConstraint(fields=('publication', 'page', 'encoding'), name='unique_publication_page_payload'),
+        ),
+        migrations.AddConstraint(
+            model_name='publicationpayload',
+            constraint=models.UniqueConstraint(condition=models.Q(page__isnull=True), fields=('publication', 'encoding'), name='unique_publication_full_payload'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('banners', '0006_payload_encoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=128)),
+                ('step', models.CharField(blank=True, max_length=256)),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Percent done')),
+                ('num_re_published', models.IntegerField(blank=True, null=True)),
+                ('num_newly_published', models.IntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('publication', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='banners.Publication')),
+            ],
+            options={
+                'ordering': ('-create_time',),
+            },
+        ),
+    ]
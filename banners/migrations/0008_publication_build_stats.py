@@ -0,0 +1,44 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:18
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0007_publish_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='build_duration',
+            field=models.FloatField(blank=True, help_text='Seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='build_phases',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='num_newly_published',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='num_queries',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='num_re_published',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='payload_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Bytes of the full payload', null=True),
+        ),
+    ]
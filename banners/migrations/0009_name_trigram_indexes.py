@@ -0,0 +1,36 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:21
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# admin search runs ``name__icontains``, which Postgres compiles to
+# ``UPPER("name"::text) LIKE UPPER(...)``, so the index has to be on
+# that expression to be used
+CREATE_INDEX_SQL = """
+    CREATE INDEX "{name}" ON "{table}"
+    USING gin ((UPPER("name"::text)) gin_trgm_ops)
+"""
+DROP_INDEX_SQL = 'DROP INDEX "{name}"'
+
+INDEXES = (
+    ('banner_name_trgm', 'banners_banner'),
+    ('snapshot_name_trgm', 'banners_bannersnapshot'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0008_publication_build_stats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        migrations.RunSQL(
+            CREATE_INDEX_SQL.format(name=name, table=table),
+            DROP_INDEX_SQL.format(name=name),
+        )
+        for name, table in INDEXES
+    ]
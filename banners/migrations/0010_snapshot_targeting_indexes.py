@@ -0,0 +1,34 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:21
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0009_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['countries'], name='snapshot_countries_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['languages'], name='snapshot_languages_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['segments'], name='snapshot_segments_gin', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=models.Index(condition=models.Q(segments=[]), fields=['publication'], name='snapshot_untargeted_segments'),
+        ),
+        migrations.AddIndex(
+            model_name='bannersnapshot',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['slot'], name='snapshot_slot_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
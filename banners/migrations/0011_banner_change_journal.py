@@ -0,0 +1,42 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# journals banners changed since they were last published, so the first
+# incremental publish does not miss them
+JOURNAL_UNPUBLISHED_SQL = """
+    INSERT INTO "banners_bannerchange" ("banner_id", "reason", "create_time")
+    SELECT "id", 'saved', now() FROM "banners_banner"
+    WHERE "active"
+    AND ("published_at" IS NULL OR "update_time" > "published_at")
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0010_snapshot_targeting_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannerChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('reason', models.CharField(choices=[('saved', 'Saved'), ('deactivated', 'Deactivated'), ('duplicated', 'Duplicated'), ('slot_changed', 'Slot changed'), ('page_changed', 'Page changed')], max_length=128)),
+                ('create_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('banner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='banners.Banner')),
+                ('publication', models.ForeignKey(blank=True, help_text='Publication that published the change', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='changes', to='banners.Publication')),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bannerchange',
+            index=models.Index(condition=models.Q(publication__isnull=True), fields=['id'], name='banner_change_pending'),
+        ),
+        migrations.RunSQL(JOURNAL_UNPUBLISHED_SQL, migrations.RunSQL.noop),
+    ]
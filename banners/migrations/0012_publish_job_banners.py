@@ -0,0 +1,18 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0011_banner_change_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishjob',
+            name='banners',
+            field=models.ManyToManyField(blank=True, help_text='Only these banners are published when set', related_name='_publishjob_banners_+', to='banners.Banner'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.1 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+# publications with a materialized payload were made by the publish
+# that logs every snapshot
+MARK_LOGGED_SQL = """
+    UPDATE "banners_publication" SET "complete_snapshots_log" = true
+    WHERE EXISTS (
+        SELECT 1 FROM "banners_publicationpayload"
+        WHERE "publication_id" = "banners_publication"."id"
+    )
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0012_publish_job_banners'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='complete_snapshots_log',
+            field=models.BooleanField(default=False, help_text='Logs every snapshot it published'),
+        ),
+        migrations.RunSQL(MARK_LOGGED_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,5 +1,9 @@
+from .body import BannerBody
 from .page import Page
 from .slot import Slot
 from .banner import Publication
+from .publication import PublicationPayload
+from .publish_job import PublishJob
 from .banner import Banner
 from .banner import BannerSnapshot
+from .journal import BannerChange
@@ -1,13 +1,18 @@
 import uuid
-import base64
-import json
 
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
 from django.conf import settings
 from django.db.models.manager import BaseManager
-from django.core.serializers.json import DjangoJSONEncoder
 
+from banners.constants import BannerChangeReason
+from banners.hashing import DIGEST_SIZE, BannerHasher, hash_copy
+from banners.metrics import PublishTimer
+from banners.models.body import BannerBody
+from banners.models.journal import BannerChange
+from banners.models.page import Page
 from banners.models.publication import Publication
 from banners.models.slot import Slot
 from helpers.fields import ChoiceArrayField
@@ -38,7 +43,11 @@ class BaseBanner(BaseModel):
     dismissible = models.BooleanField(default=True)
     stopped = models.BooleanField(default=False)
 
-    body = models.TextField()
+    body_content = models.ForeignKey(
+        BannerBody,
+        on_delete=models.PROTECT,
+        related_name='+',
+    )
 
     languages = ChoiceArrayField(
         models.CharField(
@@ -50,21 +59,28 @@ class BaseBanner(BaseModel):
         ),
         blank=True, default=list,
     )
-    hash_base64 = models.TextField(unique=True, max_length=256)
+    content_hash = models.CharField(
+        unique=True, max_length=2 * DIGEST_SIZE,
+    )
 
     def to_copy(self):
         raise NotImplementedError
 
     def get_hash(self):
-        return base64.b64encode(
-            json.dumps(
-                self.to_copy(),
-                cls=DjangoJSONEncoder,
-            ).encode()
-        )
+        return hash_copy(self.to_copy())
+
+    @property
+    def body(self):
+        # loaded lazily unless selected with ``body_content``
+        return self.body_content.content
+
+    @body.setter
+    def body(self, content):
+        self.body_content = BannerBody.from_content(content)
 
     def save(self, *args, **kwargs):
-        self.hash_base64 = self.get_hash()
+        self.content_hash = self.get_hash()
+        BannerBody.objects.store(self.body_content)
         super(BaseBanner, self).save(*args, **kwargs)
 
     class Meta:
@@ -84,20 +100,97 @@ class BaseBanner(BaseModel):
         }
 
 
+# copies banners, that have no snapshot with their current hash yet,
+# into new snapshots of a publication
+CREATE_SNAPSHOTS_SQL = """
+    INSERT INTO "{snapshot}" (
+        "id", "create_time", "update_time",
+        "priority", "countries", "start_time", "end_time",
+        "dismissible", "stopped", "body_content_id", "languages",
+        "content_hash",
+        "name", "slot", "segments",
+        "original_banner_id", "publication_id"
+    )
+    SELECT
+        md5(random()::text || clock_timestamp()::text)::uuid,
+        clock_timestamp(), clock_timestamp(),
+        b."priority", b."countries", b."start_time", b."end_time",
+        b."dismissible", b."stopped", b."body_content_id", b."languages",
+        b."content_hash",
+        b."name",
+        jsonb_build_object(
+            'id', s."id"::text,
+            'name', s."name",
+            'page', jsonb_build_object(
+                'id', p."id"::text,
+                'name', p."name",
+                'description', p."description"
+            )
+        ),
+        to_jsonb(b."segments"),
+        b."id", %s
+    FROM "{banner}" b
+    JOIN "{slot}" s ON s."id" = b."slot_id"
+    JOIN "{page}" p ON p."id" = s."page_id"
+    WHERE b."id" IN ({banners})
+    AND NOT EXISTS (
+        SELECT 1 FROM "{snapshot}" existing
+        WHERE existing."original_banner_id" = b."id"
+        AND existing."content_hash" = b."content_hash"
+    )
+    ORDER BY b."create_time" DESC, b."id"
+"""
+
+LOG_SNAPSHOTS_SQL = """
+    INSERT INTO "{snapshots_log}" ("bannersnapshot_id", "publication_id")
+    SELECT "id", %s FROM "{snapshot}" WHERE "publication_id" = %s
+    ON CONFLICT DO NOTHING
+"""
+
+
 class BannerQuerySet(models.QuerySet):
 
     def delete(self):
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_DEACTIVATED.value,
+            pk__in=self.filter(active=True).values('pk'),
+        )
         return self.update(active=False)
 
-    def duplicate(self):
-        new_banners = []
-        for banner in self.all():
+    def duplicate(self, workers=None):
+        new_banners = list(
+            self.select_related('slot__page', 'body_content')
+        )
+        for banner in new_banners:
             banner.pk = None
             banner.published_at = None
             banner.name = banner.name[:80] + f' (copy {uuid.uuid4()})'
-            banner.hash_base64 = banner.get_hash()
-            new_banners.append(banner)
-        return self.bulk_create(new_banners)
+        hashes = BannerHasher().hash_many(new_banners, workers=workers)
+        for banner, banner_hash in zip(new_banners, hashes):
+            banner.content_hash = banner_hash
+        new_banners = self.bulk_create(new_banners)
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_DUPLICATED.value,
+            pk__in=[banner.pk for banner in new_banners],
+        )
+        return new_banners
+
+    def rehash(self, workers=None, batch_size=1000):
+        """
+        Recomputes hashes in bulk and stores the ones that changed,
+        e.g. after their slot or page was renamed.
+        """
+        banners = list(self.select_related('slot__page', 'body_content'))
+        hashes = BannerHasher().hash_many(banners, workers=workers)
+        stale_banners = []
+        for banner, banner_hash in zip(banners, hashes):
+            if banner.content_hash != banner_hash:
+                banner.content_hash = banner_hash
+                stale_banners.append(banner)
+        self.model.objects.bulk_update(
+            stale_banners, ['content_hash'], batch_size=batch_size,
+        )
+        return len(stale_banners)
 
     def publishable_banners(self):
         return self.filter(slot__hidden=False)
@@ -105,37 +198,57 @@ class BannerQuerySet(models.QuerySet):
     def not_publishable_banners(self):
         return self.exclude(slot__hidden=False)
 
-    def republish_snapshots(self, to_publication):
+    def republish_snapshots(self, to_publication, timer=None):
+        """
+        Publishes banners with set based statements: reuses snapshots
+        with an unchanged hash, copies changed banners into new snapshots
+        with a single ``INSERT ... SELECT`` and logs all of them for
+        the publication. The number of queries does not depend
+        on the number of banners.
+
+        Phases are measured with ``timer`` when given.
+        """
+        timer = timer or PublishTimer()
         to_republish = BannerSnapshot.objects.filter(
             original_banner__in=self.all(),
-            original_banner__hash_base64=models.F('hash_base64')
-        )
-        num_republished = to_republish.update(
-            publication=to_publication,
-        )
-        to_publication.snapshots_log.add(
-            *to_republish.values_list('id', flat=True)
-        )
-        to_publish = self.exclude(
-            snapshots__hash_base64=models.F('hash_base64')
+            original_banner__content_hash=models.F('content_hash')
         )
-
-        snapshots_to_create = []
-        for banner in to_publish:
-            snapshot = BannerSnapshot(
-                original_banner=banner,
+        with timer.phase('republish'):
+            num_republished = to_republish.update(
                 publication=to_publication,
-                **banner.to_copy()
             )
-            snapshot.hash_base64 = snapshot.get_hash()
-            snapshots_to_create.append(snapshot)
-
-        BannerSnapshot.objects.bulk_create(snapshots_to_create)
 
-        to_publication.snapshots_log.add(
-            *to_publish.values_list('id', flat=True)
-        )
-        return num_republished, len(snapshots_to_create)
+        try:
+            banners_sql, banners_params = self.order_by().values('id').\
+                query.sql_with_params()
+        except EmptyResultSet:
+            # e.g. ``none()`` or ``pk__in=[]``, nothing to copy
+            banners_sql = None
+        snapshots_log = BannerSnapshot.publications_log.through
+        tables = {
+            'snapshot': BannerSnapshot._meta.db_table,
+            'snapshots_log': snapshots_log._meta.db_table,
+            'banner': Banner._meta.db_table,
+            'slot': Slot._meta.db_table,
+            'page': Page._meta.db_table,
+        }
+        num_newly_published = 0
+        with connection.cursor() as cursor:
+            with timer.phase('create_snapshots'):
+                if banners_sql is not None:
+                    cursor.execute(
+                        CREATE_SNAPSHOTS_SQL.format(
+                            banners=banners_sql, **tables
+                        ),
+                        [str(to_publication.id), *banners_params],
+                    )
+                    num_newly_published = cursor.rowcount
+            with timer.phase('log_snapshots'):
+                cursor.execute(
+                    LOG_SNAPSHOTS_SQL.format(**tables),
+                    [str(to_publication.id), str(to_publication.id)],
+                )
+        return num_republished, num_newly_published
 
 
 class ActiveBannerManager(BaseManager.from_queryset(BannerQuerySet)):
@@ -178,11 +291,26 @@ class Banner(BaseBanner):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(Banner, self).save(*args, **kwargs)
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_SAVED.value
+            if self.active else
+            BannerChangeReason.REASON_DEACTIVATED.value,
+            pk=self.pk,
+        )
+
     def delete(self, *args, **kwargs):
         self.active = False
         self.save()
 
 
+class BannerSnapshotQuerySet(models.QuerySet):
+
+    def with_body(self):
+        return self.select_related('body_content')
+
+
 class BannerSnapshot(BaseBanner):
     name = models.CharField(max_length=256)
     slot = JSONField()
@@ -203,6 +331,36 @@ class BannerSnapshot(BaseBanner):
         related_name='snapshots_log',
     )
 
+    objects = BannerSnapshotQuerySet.as_manager()
+
+    class Meta(BaseBanner.Meta):
+        indexes = [
+            # keyset pagination of a publication
+            models.Index(
+                fields=['publication', 'create_time', 'id'],
+                name='snapshot_publication_keyset',
+            ),
+            # containment filters of the live API
+            GinIndex(fields=['countries'], name='snapshot_countries_gin'),
+            GinIndex(fields=['languages'], name='snapshot_languages_gin'),
+            GinIndex(
+                fields=['segments'],
+                name='snapshot_segments_gin',
+                opclasses=['jsonb_path_ops'],
+            ),
+            # jsonb_path_ops can not match the empty, untargeted segments
+            models.Index(
+                fields=['publication'],
+                condition=models.Q(segments=[]),
+                name='snapshot_untargeted_segments',
+            ),
+            GinIndex(
+                fields=['slot'],
+                name='snapshot_slot_gin',
+                opclasses=['jsonb_path_ops'],
+            ),
+        ]
+
     def to_copy(self):
         dump = super(BannerSnapshot, self).dump()
         dump.update(
@@ -0,0 +1,30 @@
+from django.db import models
+
+from banners.hashing import DIGEST_SIZE, digest
+
+
+class BannerBodyQuerySet(models.QuerySet):
+
+    def store(self, *bodies):
+        """
+        Makes sure the given bodies are stored, bodies that already
+        exist are left untouched.
+        """
+        self.bulk_create(bodies, ignore_conflicts=True)
+
+
+class BannerBody(models.Model):
+    """
+    Banner HTML stored once and shared by banners and snapshots,
+    addressed by the digest of its content.
+    """
+    digest = models.CharField(primary_key=True, max_length=2 * DIGEST_SIZE)
+    content = models.TextField()
+
+    create_time = models.DateTimeField(auto_now_add=True)
+
+    objects = BannerBodyQuerySet.as_manager()
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(digest=digest(content), content=content)
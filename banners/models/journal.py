@@ -0,0 +1,94 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
+from django.utils import timezone
+
+from banners.constants import BannerChangeReason
+from banners.models.publication import Publication
+
+
+# journals every banner selected by a subquery with a single statement
+RECORD_CHANGES_SQL = """
+    INSERT INTO "{journal}" ("banner_id", "reason", "create_time")
+    SELECT "id", %s, %s FROM ({banners}) changed
+"""
+
+
+class BannerChangeQuerySet(models.QuerySet):
+
+    def record(self, reason, **filters):
+        """
+        Journals a change of all banners, active or not, matching
+        ``filters``.
+        """
+        banner_model = self.model._meta.get_field('banner').related_model
+        try:
+            banners_sql, banners_params = banner_model._base_manager.\
+                filter(**filters).\
+                order_by().\
+                values('id').\
+                query.sql_with_params()
+        except EmptyResultSet:
+            # e.g. ``pk__in=[]``
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RECORD_CHANGES_SQL.format(
+                    journal=self.model._meta.db_table,
+                    banners=banners_sql,
+                ),
+                [reason, timezone.now(), *banners_params],
+            )
+            return cursor.rowcount
+
+    def pending(self):
+        return self.filter(publication__isnull=True)
+
+    def claim(self, publication):
+        """
+        Marks pending changes as published by ``publication``. Changes
+        committed meanwhile stay pending for the next publish.
+        """
+        return self.pending().update(publication=publication)
+
+
+class BannerChange(models.Model):
+    """
+    Journal of changes that affect published banners, publish only
+    processes banners changed since the live publication.
+    """
+    id = models.BigAutoField(primary_key=True)
+    banner = models.ForeignKey(
+        'banners.Banner',
+        on_delete=models.CASCADE,
+        related_name='changes',
+    )
+    reason = models.CharField(
+        choices=(
+            (BannerChangeReason.REASON_SAVED.value, 'Saved'),
+            (BannerChangeReason.REASON_DEACTIVATED.value, 'Deactivated'),
+            (BannerChangeReason.REASON_DUPLICATED.value, 'Duplicated'),
+            (BannerChangeReason.REASON_SLOT_CHANGED.value, 'Slot changed'),
+            (BannerChangeReason.REASON_PAGE_CHANGED.value, 'Page changed'),
+        ),
+        max_length=128,
+    )
+    create_time = models.DateTimeField(default=timezone.now)
+    publication = models.ForeignKey(
+        Publication,
+        on_delete=models.SET_NULL,
+        blank=True, null=True,
+        related_name='changes',
+        help_text='Publication that published the change',
+    )
+
+    objects = BannerChangeQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-id', )
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(publication__isnull=True),
+                name='banner_change_pending',
+            ),
+        ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from banners.constants import BannerChangeReason
+from banners.models.journal import BannerChange
 from helpers.models import BaseModel
 
 
@@ -7,6 +9,14 @@ class Page(BaseModel):
     name = models.CharField(unique=True, max_length=256)
     description = models.TextField()
 
+    def save(self, *args, **kwargs):
+        super(Page, self).save(*args, **kwargs)
+        # page name and description are copied into banners snapshots
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_PAGE_CHANGED.value,
+            slot__page=self, active=True,
+        )
+
     def to_dict(self):
         return {
             'id': str(self.id),
@@ -1,6 +1,7 @@
 from django.conf import settings
+from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.db.models.manager import BaseManager
 
 from banners.constants import BannersPublicationState
@@ -37,6 +38,34 @@ class Publication(BaseModel):
         on_delete=models.CASCADE,
     )
 
+    # publications made before snapshots were logged can not be diffed
+    complete_snapshots_log = models.BooleanField(
+        default=False, help_text='Logs every snapshot it published',
+    )
+
+    # build statistics, empty for publications made before they
+    # were recorded
+    build_duration = models.FloatField(
+        blank=True, null=True, help_text='Seconds',
+    )
+    # [phase, seconds] pairs in the order the phases ran
+    build_phases = JSONField(blank=True, default=list)
+    num_re_published = models.PositiveIntegerField(blank=True, null=True)
+    num_newly_published = models.PositiveIntegerField(blank=True, null=True)
+    payload_size = models.PositiveIntegerField(
+        blank=True, null=True, help_text='Bytes of the full payload',
+    )
+    num_queries = models.PositiveIntegerField(blank=True, null=True)
+
+    BUILD_STATS_FIELDS = (
+        'build_duration',
+        'build_phases',
+        'num_re_published',
+        'num_newly_published',
+        'payload_size',
+        'num_queries',
+    )
+
     objects = BaseManager.from_queryset(PublicationQuerySet)()
 
     class Meta:
@@ -50,3 +79,54 @@ class Publication(BaseModel):
             )
         ]
         ordering = ('-create_time',)
+
+    def diff(self, since):
+        """
+        Compares snapshots of this publication with the ones logged
+        for an earlier publication.
+
+        Returns querysets of snapshots that are new for ``since``
+        (annotated with ``was_published`` when the original banner
+        was already there) and of ``since`` snapshots that are not
+        published anymore, either removed or replaced by a new one.
+        """
+        old_snapshots = since.snapshots_log.all()
+        new_snapshots = self.banners.\
+            exclude(id__in=old_snapshots.values('id')).\
+            annotate(
+                was_published=Exists(
+                    old_snapshots.filter(
+                        original_banner=OuterRef('original_banner'),
+                    )
+                )
+            )
+        removed_snapshots = old_snapshots.exclude(
+            id__in=self.banners.values('id'),
+        )
+        return new_snapshots, removed_snapshots
+
+
+class PublicationPayload(BaseModel):
+    publication = models.ForeignKey(
+        Publication,
+        on_delete=models.CASCADE,
+        related_name='payloads',
+    )
+    # empty for the full catalog, otherwise a slice for a single page
+    page = models.UUIDField(blank=True, null=True)
+    # content coding of the stored bytes
+    encoding = models.CharField(max_length=16, default='identity')
+    content = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['publication', 'page', 'encoding'],
+                name='unique_publication_page_payload',
+            ),
+            models.UniqueConstraint(
+                fields=['publication', 'encoding'],
+                condition=Q(page__isnull=True),
+                name='unique_publication_full_payload',
+            ),
+        ]
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db import models
+
+from banners.constants import PublishJobState
+from banners.models.publication import Publication
+from helpers.models import BaseModel
+
+
+class PublishJob(BaseModel):
+    state = models.CharField(
+        choices=(
+            (PublishJobState.STATE_QUEUED.value, 'Queued'),
+            (PublishJobState.STATE_RUNNING.value, 'Running'),
+            (PublishJobState.STATE_DONE.value, 'Done'),
+            (PublishJobState.STATE_FAILED.value, 'Failed'),
+        ),
+        default=PublishJobState.STATE_QUEUED.value,
+        max_length=128,
+    )
+    step = models.CharField(max_length=256, blank=True)
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Percent done',
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    publication = models.ForeignKey(
+        Publication,
+        on_delete=models.SET_NULL,
+        blank=True, null=True,
+        related_name='+',
+    )
+    banners = models.ManyToManyField(
+        'banners.Banner',
+        blank=True,
+        related_name='+',
+        help_text='Only these banners are published when set',
+    )
+    num_re_published = models.IntegerField(blank=True, null=True)
+    num_newly_published = models.IntegerField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-create_time', )
+
+    def get_banners(self):
+        """
+        Banners selected to be published, deactivated ones included,
+        or ``None`` when all changed banners are published.
+        """
+        selected = self.banners.through.objects.filter(publishjob=self)
+        if not selected.exists():
+            return None
+        banner_model = self._meta.get_field('banners').related_model
+        return banner_model._base_manager.filter(
+            id__in=selected.values('banner_id'),
+        )
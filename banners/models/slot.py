@@ -1,5 +1,7 @@
 from django.db import models
 
+from banners.constants import BannerChangeReason
+from banners.models.journal import BannerChange
 from banners.models.page import Page
 from helpers.models import BaseModel
 
@@ -13,6 +15,14 @@ class Slot(BaseModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(Slot, self).save(*args, **kwargs)
+        # renames and ``hidden`` toggles change what is published
+        BannerChange.objects.record(
+            BannerChangeReason.REASON_SLOT_CHANGED.value,
+            slot=self, active=True,
+        )
+
     def to_dict(self):
         return {
             'id': str(self.id),
@@ -0,0 +1,115 @@
+import logging
+import select
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+PUBLICATION_CHANNEL = 'banners_publication'
+
+
+class PublicationNotifier(object):
+    """
+    Wakes up threads waiting for a new live publication.
+
+    Publishes made by this process notify waiters directly, publishes
+    made by other processes are received through Postgres LISTEN in a
+    single background thread per process.
+    """
+    reconnect_delay = 5
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.waiters = 0
+        self.listener = None
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout):
+        """
+        Blocks until a publication newer than ``version`` is announced
+        or ``timeout`` seconds pass.
+        """
+        self.ensure_listener()
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.version != version, timeout,
+            )
+
+    @contextmanager
+    def waiter(self, max_waiters):
+        """
+        Claims one of ``max_waiters`` waiting slots of the process and
+        yields whether a slot was free.
+        """
+        with self.condition:
+            claimed = self.waiters < max_waiters
+            if claimed:
+                self.waiters += 1
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                with self.condition:
+                    self.waiters -= 1
+
+    def ensure_listener(self):
+        if connection.vendor != 'postgresql':
+            return
+        with self.condition:
+            if self.listener is not None and self.listener.is_alive():
+                return
+            self.listener = threading.Thread(
+                target=self.listen,
+                name='banners-publication-listener',
+                daemon=True,
+            )
+            self.listener.start()
+
+    def listen(self):
+        while True:
+            try:
+                self.listen_forever()
+            except Exception:
+                logger.exception('Publication listener failed')
+                connection.close()
+                time.sleep(self.reconnect_delay)
+
+    def listen_forever(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {PUBLICATION_CHANNEL}')
+        pg_connection = connection.connection
+        while True:
+            readable, _, _ = select.select([pg_connection], [], [], 60)
+            if not readable:
+                continue
+            pg_connection.poll()
+            if pg_connection.notifies:
+                pg_connection.notifies.clear()
+                self.notify()
+
+
+notifier = PublicationNotifier()
+
+
+def announce_publication(publication):
+    """
+    Announces a new live publication once the current transaction
+    commits.
+    """
+    if connection.vendor == 'postgresql':
+        # NOTIFY is transactional, listeners only get it after commit
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [PUBLICATION_CHANNEL, str(publication.id)],
+            )
+    transaction.on_commit(notifier.notify)
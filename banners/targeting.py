@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+
+
+# posting list key of banners that are not restricted by a field
+ANY = '*'
+
+TARGETING_FIELDS = ('countries', 'languages', 'segments')
+
+
+def build_index(banners):
+    """
+    Builds an inverted index of serialized banners:
+    page id -> slot id -> candidate banner ids, plus posting lists
+    of banner ids per country, language and segment.
+
+    Every list is sorted by priority, highest first. Banners with
+    an empty targeting field match any value and are listed under
+    ``ANY`` for that field.
+    """
+    index = OrderedDict()
+    for banner in sorted(banners, key=lambda banner: -banner['priority']):
+        slot = banner['slot']
+        slot_index = index.setdefault(slot['page']['id'], OrderedDict()).\
+            setdefault(
+                slot['id'],
+                OrderedDict(
+                    [('banners', [])] +
+                    [(field, OrderedDict()) for field in TARGETING_FIELDS]
+                ),
+            )
+
+        slot_index['banners'].append(banner['id'])
+        for field in TARGETING_FIELDS:
+            for value in banner[field] or [ANY]:
+                slot_index[field].setdefault(value, []).append(banner['id'])
+    return index
+
+
+class Matcher(object):
+    """
+    Immutable in-memory matcher of the serialized banners of
+    a single publication.
+    """
+
+    def __init__(self, publication_id, banners):
+        self.publication_id = publication_id
+        self.banners = {banner['id']: banner for banner in banners}
+        self.windows = {
+            banner['id']: (
+                parse_datetime(banner['start_time'] or ''),
+                parse_datetime(banner['end_time'] or ''),
+            )
+            for banner in banners
+        }
+        self.slots = {}
+        for page_id, slots in build_index(banners).items():
+            for slot_id, slot_index in slots.items():
+                self.slots[page_id, slot_id] = (
+                    tuple(slot_index['banners']),
+                    {
+                        field: {
+                            value: frozenset(banner_ids)
+                            for value, banner_ids in postings.items()
+                        }
+                        for field, postings in slot_index.items()
+                        if field in TARGETING_FIELDS
+                    },
+                )
+
+    def match(self, page, slot, now,
+              country=None, language=None, segments=()):
+        """
+        Returns eligible banners of a page slot ranked by priority.
+
+        Banners restricted by country or language only match when
+        it is given, segment restricted banners need at least one
+        of the given segments.
+        """
+        try:
+            banner_ids, postings = self.slots[page, slot]
+        except KeyError:
+            return []
+
+        allowed = {
+            'countries': [country],
+            'languages': [language],
+            'segments': segments,
+        }
+        eligible = []
+        for banner_id in banner_ids:
+            banner = self.banners[banner_id]
+            if banner['stopped']:
+                continue
+            start_time, end_time = self.windows[banner_id]
+            if start_time is not None and now < start_time:
+                continue
+            if end_time is not None and now >= end_time:
+                continue
+            if all(
+                any(
+                    banner_id in postings[field].get(value, ())
+                    for value in [ANY, *values]
+                )
+                for field, values in allowed.items()
+            ):
+                eligible.append(banner)
+        return eligible
@@ -1,3 +1,1672 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import zstandard
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.renderers import JSONRenderer
+
+from banners.api.encoders import SnapshotEncoder, dumps
+from banners.api.pagination import PublicationCursorPagination
+from banners.api.payloads import (
+    compress_publication, encode_banners, get_live_matcher,
+    get_payload_content, prune_payloads, render_payload,
+)
+from banners.api.serializers import (
+    BannerPublicationDeltaSerializer, BannerPublicationSerializer,
+    BannerSnapshotModelSerializer,
+)
+from banners.api.streaming import stream_banners
+from banners.artifacts import write_artifacts
+from banners.backend import publish, publish_publication
+from banners.benchmarks import Size, benchmark_size
+from banners.constants import PublishJobState
+from banners.jobs import LocalPublishWorker
+from banners.metrics import Counter, Histogram, Registry
+from banners.compression import IDENTITY, negotiate_encoding
+from banners.notifications import PublicationNotifier
+from banners.targeting import Matcher, build_index
+from banners.models import (
+    Banner, BannerChange, Page, Publication, PublicationPayload, PublishJob,
+    Slot,
+)
+from helpers.admin import EstimatedCountPaginator
+from helpers.queries import QueryBudgetMixin
+
+
+_names = itertools.count()
+
+DECOMPRESSORS = {
+    'br': brotli.decompress,
+    'zstd': lambda content: zstandard.ZstdDecompressor().decompress(content),
+    'gzip': gzip.decompress,
+}
+
+
+def create_banners(count, slot=None):
+    if slot is None:
+        page = Page.objects.create(
+            name=f'page {next(_names)}', description='Page',
+        )
+        slot = Slot.objects.create(
+            name=f'slot {next(_names)}', description='Slot', page=page,
+        )
+    return [
+        Banner.objects.create(
+            name=f'banner {next(_names)}',
+            slot=slot,
+            body=f'<p>Banner {i}</p>',
+            countries=['FI'],
+            segments=['members'],
+        )
+        for i in range(count)
+    ]
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'admin',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        banners = create_banners(3)
+        self.slot = banners[0].slot
+        self.page = self.slot.page
+        publish(self.user)
+
+    def grow(self):
+        create_banners(5, slot=self.slot)
+        create_banners(5)
+        publish(self.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+
+class LiveBannersQueriesTest(QueryBudgetTestCase):
+    url = '/api/v1/banners/live/'
+
+    def setUp(self):
+        super(LiveBannersQueriesTest, self).setUp()
+        self.client.logout()
+
+    def test_stored_payload(self):
+        self.assertConstantQueries(2, self.get, self.grow, self.url)
+
+    def test_page_payload(self):
+        self.assertConstantQueries(
+            2, self.get, self.grow, self.url, page=str(self.page.id),
+        )
+
+    def test_limit_offset(self):
+        self.assertConstantQueries(
+            3, self.get, self.grow, self.url, limit=100, offset=0,
+        )
+
+    def test_cursor(self):
+        self.assertConstantQueries(
+            2, self.get, self.grow, self.url, cursor='', limit=100,
+        )
+
+    def test_sparse_fields_skip_body(self):
+        recorder = self.assertQueryBudget(
+            3, self.get, self.url, fields='id,priority,slot',
+        )
+        self.assertFalse(
+            any(
+                'banners_bannerbody' in query.sql
+                for query in recorder.queries
+            ),
+            recorder.report(),
+        )
+
+    def test_delta(self):
+        since = Publication.objects.get_live_publication()
+
+        def grow():
+            create_banners(5, slot=self.slot)
+            publish(self.user)
+
+        self.assertConstantQueries(
+            5, self.get, grow, self.url, since=str(since.id),
+        )
+
+
+class PublishQueriesTest(QueryBudgetTestCase):
+
+    def test_publish(self):
+        self.assertConstantQueries(16, publish, self.grow, self.user)
+
+    def test_duplicate(self):
+        self.assertConstantQueries(
+            3, lambda: Banner.objects.filter(slot=self.slot).duplicate(),
+            lambda: create_banners(10, slot=self.slot),
+        )
+
+
+class AdminQueriesTest(QueryBudgetTestCase):
+
+    def test_banner_changelist(self):
+        self.assertConstantQueries(
+            5, self.get, self.grow, reverse('admin:banners_banner_changelist'),
+        )
+
+    def test_banner_change(self):
+        banner = Banner.objects.first()
+        self.assertConstantQueries(
+            8, self.get, self.grow,
+            reverse('admin:banners_banner_change', args=[banner.id]),
+        )
+
+    def test_snapshot_changelist(self):
+        recorder = self.assertConstantQueries(
+            5, self.get, self.grow,
+            reverse('admin:banners_bannersnapshot_changelist'),
+        )
+        self.assertFalse(
+            any(
+                'banners_bannerbody' in query.sql
+                for query in recorder.queries
+            ),
+            recorder.report(),
+        )
+
+    def test_snapshot_change(self):
+        snapshot = Publication.objects.get_live_publication().banners.first()
+        self.assertConstantQueries(
+            6, self.get, self.grow,
+            reverse('admin:banners_bannersnapshot_change', args=[snapshot.id]),
+        )
+
+    def test_publication_changelist(self):
+        self.assertConstantQueries(
+            5, self.get, self.grow,
+            reverse('admin:banners_publication_changelist'),
+        )
+
+    def test_publication_change(self):
+        publication = Publication.objects.get_live_publication()
+
+        def grow():
+            self.grow()
+            # log more snapshots into the same publication
+            Banner.objects.publishable_banners().\
+                republish_snapshots(publication)
+
+        self.assertConstantQueries(
+            9, self.get, grow,
+            reverse('admin:banners_publication_change', args=[publication.id]),
+        )
+
+    def test_publish_job_changelist(self):
+        def grow():
+            PublishJob.objects.bulk_create(
+                PublishJob(created_by=self.user) for _ in range(5)
+            )
+
+        PublishJob.objects.create(created_by=self.user)
+        self.assertConstantQueries(
+            5, self.get, grow,
+            reverse('admin:banners_publishjob_changelist'),
+        )
+
+
+class ConditionalGetTest(TestCase):
+    url = '/api/v1/banners/live/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        create_banners(2)
+        publish(cls.user)
+        cls.publication = Publication.objects.get_live_publication()
+
+    def get(self, **headers):
+        return self.client.get(self.url, HTTP_HOST='localhost', **headers)
+
+    def test_headers(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.publication.id.hex}"')
+        self.assertNotIn('Last-Modified', response)
+        vary = [header.strip() for header in response['Vary'].split(',')]
+        self.assertIn('Accept', vary)
+        self.assertIn('Accept-Encoding', vary)
+
+    def test_etag_per_encoding(self):
+        etags = set()
+        for headers in (
+            {},
+            {'HTTP_ACCEPT_ENCODING': 'gzip'},
+            {'HTTP_ACCEPT_ENCODING': 'br'},
+            {'HTTP_ACCEPT_ENCODING': 'zstd'},
+            {'HTTP_ACCEPT': 'application/x-ndjson'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 200)
+                etags.add(response['ETag'])
+        self.assertEqual(len(etags), 5)
+
+    def test_not_modified(self):
+        for headers in (
+            {},
+            {'HTTP_ACCEPT_ENCODING': 'br'},
+            {'HTTP_ACCEPT': 'application/x-ndjson'},
+        ):
+            with self.subTest(headers=headers):
+                etag = self.get(**headers)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.get(HTTP_IF_NONE_MATCH=etag, **headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_other_encoding_modified(self):
+        etag = self.get(HTTP_ACCEPT_ENCODING='br')['ETag']
+        response = self.get(
+            HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_modified_within_a_second(self):
+        etag = self.get()['ETag']
+        create_banners(1)
+        publish(self.user)
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['banners']), 3)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for _ in range(3):
+            create_banners(1)
+
+    def get_count(self, queryset, estimate):
+        with mock.patch(
+            'helpers.admin.estimate_count', return_value=estimate,
+        ) as estimate_count:
+            count = EstimatedCountPaginator(queryset, 10).count
+        return count, estimate_count.called
+
+    def test_unfiltered(self):
+        self.assertEqual(
+            self.get_count(Page.objects.all(), 50000), (50000, True),
+        )
+        self.assertEqual(self.get_count(Page.objects.all(), 10), (3, True))
+
+    def test_filtered(self):
+        for queryset in (
+            Page.objects.filter(name__icontains='page'),
+            Page.objects.filter(name__icontains='page', description='Page'),
+            # the default manager filters active banners
+            Banner.objects.all(),
+        ):
+            with self.subTest(query=str(queryset.query)):
+                self.assertEqual(self.get_count(queryset, 50000), (3, False))
+
+
+class LiveDeltaTest(TestCase):
+    url = '/api/v1/banners/live/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+
+    def setUp(self):
+        self.banners = create_banners(3)
+        publish(self.user)
+        self.since = Publication.objects.get_live_publication()
+
+    def get_delta(self, since=None, **params):
+        response = self.client.get(
+            self.url,
+            dict(params, since=str(since or self.since.id)),
+            HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def get_snapshot_id(self, banner):
+        publication = Publication.objects.get_live_publication()
+        return str(publication.banners.get(original_banner=banner).id)
+
+    def test_delta(self):
+        changed, removed, _ = self.banners
+        old_changed_id = self.get_snapshot_id(changed)
+        old_removed_id = self.get_snapshot_id(removed)
+        changed.body = '<p>Changed</p>'
+        changed.save()
+        removed.delete()
+        added, = create_banners(1, slot=changed.slot)
+        publish(self.user)
+
+        delta = self.get_delta()
+        self.assertEqual(
+            [banner['id'] for banner in delta['added']],
+            [self.get_snapshot_id(added)],
+        )
+        self.assertEqual(
+            [banner['id'] for banner in delta['changed']],
+            [self.get_snapshot_id(changed)],
+        )
+        self.assertEqual(
+            delta['changed'][0]['body'], '<p>Changed</p>',
+        )
+        self.assertEqual(
+            sorted(delta['removed']), sorted([old_changed_id, old_removed_id]),
+        )
+
+    def test_nothing_changed(self):
+        publish(self.user)
+        delta = self.get_delta()
+        self.assertEqual(
+            (delta['added'], delta['changed'], delta['removed']),
+            ([], [], []),
+        )
+
+    def test_unknown_since(self):
+        delta = self.get_delta(since=uuid.uuid4())
+        self.assertEqual(delta['count'], 3)
+        self.assertEqual(len(delta['banners']), 3)
+
+    def test_since_incomplete_log(self):
+        Publication.objects.filter(id=self.since.id).\
+            update(complete_snapshots_log=False)
+        publish(self.user)
+        delta = self.get_delta()
+        self.assertNotIn('removed', delta)
+        self.assertEqual(len(delta['banners']), 3)
+
+    def test_since_without_payloads(self):
+        self.since.payloads.all().delete()
+        publish(self.user)
+        delta = self.get_delta()
+        self.assertEqual(delta['since'], str(self.since.id))
+        self.assertEqual(delta['removed'], [])
+
+
+class CursorPaginationTest(TestCase):
+    url = '/api/v1/banners/live/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        create_banners(4)
+        create_banners(3)
+        publish(cls.user)
+        cls.publication = Publication.objects.get_live_publication()
+        # bulk created snapshots may share a create time
+        cls.publication.banners.filter(
+            id__in=cls.publication.banners.values('id')[:4],
+        ).update(create_time=timezone.now())
+
+    def get(self, url=None, status_code=200, **params):
+        response = self.client.get(
+            url or self.url, params, HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.status_code, status_code, response.content)
+        return response.json()
+
+    def test_traversal(self):
+        snapshot_ids = []
+        page = self.get(cursor='', limit=3)
+        num_pages = 1
+        while page['next'] is not None:
+            snapshot_ids += [banner['id'] for banner in page['banners']]
+            page = self.get(page['next'])
+            num_pages += 1
+        snapshot_ids += [banner['id'] for banner in page['banners']]
+
+        self.assertEqual(num_pages, 3)
+        self.assertEqual(
+            snapshot_ids,
+            [
+                str(snapshot_id)
+                for snapshot_id in self.publication.banners.
+                order_by('create_time', 'id').
+                values_list('id', flat=True)
+            ],
+        )
+
+    def test_publication_changed(self):
+        next_url = self.get(cursor='', limit=3)['next']
+        publish(self.user)
+        response = self.get(next_url, status_code=409)
+        self.assertEqual(
+            response['detail'],
+            'Live publication has changed, restart pagination.',
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in (
+            'garbage',
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            base64.urlsafe_b64encode(
+                json.dumps(
+                    [str(self.publication.id), 'yesterday', str(uuid.uuid4())]
+                ).encode()
+            ).decode(),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.get(status_code=404, cursor=cursor)
+                self.assertEqual(response['detail'], 'Invalid cursor')
+
+    @mock.patch.object(PublicationCursorPagination, 'max_limit', 2)
+    def test_max_limit(self):
+        page = self.get(cursor='', limit=100)
+        self.assertEqual(len(page['banners']), 2)
+        self.assertIsNotNone(page['next'])
+
+
+class LiveFiltersTest(TestCase):
+    url = '/api/v1/banners/live/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        cls.untargeted, cls.finnish, cls.german = create_banners(3)
+        for banner, countries, languages, segments in (
+            (cls.untargeted, [], [], []),
+            (cls.finnish, ['FI'], ['fi'], ['members']),
+            (cls.german, ['DE'], ['de'], ['guests']),
+        ):
+            banner.countries = countries
+            banner.languages = languages
+            banner.segments = segments
+            banner.save()
+        cls.other, = create_banners(1)
+        publish(cls.user)
+
+    def get(self, **params):
+        response = self.client.get(self.url, params, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def assertNames(self, banners, **params):
+        self.assertEqual(
+            sorted(banner['name'] for banner in self.get(**params)['banners']),
+            sorted(banner.name for banner in banners),
+        )
+
+    def test_empty_means_all(self):
+        self.assertNames(
+            [self.untargeted, self.finnish, self.other], country='FI',
+        )
+        self.assertNames(
+            [self.untargeted, self.german, self.other], language='de',
+        )
+        self.assertNames(
+            [self.untargeted, self.finnish, self.other], segment='members',
+        )
+        self.assertNames([self.untargeted], segment='staff')
+
+    def test_page_and_slot(self):
+        slot = self.other.slot
+        self.assertNames([self.other], page=str(slot.page_id))
+        self.assertNames([self.other], slot=str(slot.id))
+        self.assertNames(
+            [self.untargeted, self.finnish],
+            slot=str(self.finnish.slot_id), country='FI',
+        )
+
+    def test_invalid(self):
+        response = self.client.get(
+            self.url, {'country': 'XX'}, HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(LimitOffsetPagination, 'default_limit', 2)
+    def test_unpaginated_returns_all(self):
+        result = self.get(country='FI')
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(len(result['banners']), 3)
+        self.assertIsNone(result['next'])
+        self.assertIn('index', result)
+
+        result = self.get(country='FI', limit=2)
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(len(result['banners']), 2)
+        self.assertIsNotNone(result['next'])
+
+    @mock.patch.object(LimitOffsetPagination, 'default_limit', 2)
+    def test_sparse_unpaginated_returns_all(self):
+        result = self.get(fields='id,name', country='FI')
+        self.assertEqual(result['count'], 3)
+        self.assertIsNone(result['next'])
+        self.assertEqual(
+            [sorted(banner) for banner in result['banners']],
+            [['id', 'name']] * 3,
+        )
+
+        result = self.get(exclude='body')
+        self.assertEqual(result['count'], 4)
+        self.assertEqual(len(result['banners']), 4)
+        self.assertNotIn('index', result)
+
+        result = self.get(fields='id', limit=2)
+        self.assertEqual(result['count'], 4)
+        self.assertEqual(len(result['banners']), 2)
+
+    def test_delta_moved_out_of_filter(self):
+        since = Publication.objects.get_live_publication()
+        old_snapshot = since.banners.get(original_banner=self.finnish)
+        self.finnish.countries = ['DE']
+        self.finnish.save()
+        publish(self.user)
+
+        delta = self.get(since=str(since.id), country='FI')
+        self.assertEqual((delta['added'], delta['changed']), ([], []))
+        self.assertEqual(delta['removed'], [str(old_snapshot.id)])
+
+        delta = self.get(since=str(since.id), country='DE')
+        self.assertEqual(
+            [banner['name'] for banner in delta['changed']],
+            [self.finnish.name],
+        )
+
+
+@mock.patch.object(PublicationNotifier, 'ensure_listener')
+class LivePublicationChangesTest(TestCase):
+    url = '/api/v1/banners/live/changes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_banners(1)
+        publish(User.objects.create(username='publisher'))
+        cls.publication = Publication.objects.get_live_publication()
+
+    def get(self, **params):
+        return self.client.get(self.url, params, HTTP_HOST='localhost')
+
+    def test_changed(self, ensure_listener):
+        response = self.get(since=str(uuid.uuid4()), timeout=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], str(self.publication.id))
+
+    def test_not_changed(self, ensure_listener):
+        started = time.monotonic()
+        response = self.get(since=str(self.publication.id), timeout=0.1)
+        self.assertEqual(response.status_code, 304)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertNotIn('Retry-After', response)
+
+    def test_no_free_waiter(self, ensure_listener):
+        with override_settings(BSADMIN_SETTINGS=dict(
+            settings.BSADMIN_SETTINGS, LONG_POLL_MAX_WAITERS=0,
+        )):
+            started = time.monotonic()
+            response = self.get(since=str(self.publication.id), timeout=10)
+        self.assertEqual(response.status_code, 304)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(
+            response['Retry-After'],
+            str(settings.BSADMIN_SETTINGS['LONG_POLL_INTERVAL']),
+        )
+
+    def test_invalid_timeout(self, ensure_listener):
+        response = self.get(timeout='soon')
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.object(PublicationNotifier, 'ensure_listener')
+class PublicationNotifierTest(TestCase):
+
+    def test_notify(self, ensure_listener):
+        notifier = PublicationNotifier()
+        version = notifier.version
+        threading.Timer(0.05, notifier.notify).start()
+        self.assertTrue(notifier.wait(version, 5))
+        self.assertEqual(notifier.version, version + 1)
+
+    def test_timeout(self, ensure_listener):
+        notifier = PublicationNotifier()
+        self.assertFalse(notifier.wait(notifier.version, 0.05))
+
+    def test_already_notified(self, ensure_listener):
+        notifier = PublicationNotifier()
+        version = notifier.version
+        notifier.notify()
+        self.assertTrue(notifier.wait(version, 0))
+
+    def test_waiter(self, ensure_listener):
+        notifier = PublicationNotifier()
+        with notifier.waiter(1) as first:
+            with notifier.waiter(1) as second:
+                self.assertEqual((first, second), (True, False))
+        with notifier.waiter(1) as again:
+            self.assertTrue(again)
+        self.assertEqual(notifier.waiters, 0)
+
+
+class BenchmarkCommandTest(TestCase):
+
+    def test_refuses_catalog(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        create_banners(1)
+        with self.assertRaisesMessage(CommandError, 'Benchmarks need'):
+            call_command('benchmark_banners', size=['1x1x1'])
+
+    def test_publish_runs_commit_work(self):
+        user = User.objects.create(username='publisher')
+        with mock.patch(
+            'banners.benchmarks.compress_publication',
+            wraps=compress_publication,
+        ) as compress, mock.patch(
+            'banners.benchmarks.write_artifacts', wraps=write_artifacts,
+        ) as write:
+            result = benchmark_size(Size(1, 1, 2), user)
+
+        # three publishes in both the timed and the memory pass
+        self.assertEqual(compress.call_count, 6)
+        self.assertEqual(write.call_count, 6)
+        for name in ('publish_initial', 'publish_changed'):
+            self.assertEqual(
+                sorted(result['results'][name]),
+                ['peak_memory_bytes', 'queries', 'seconds'],
+            )
+        self.assertFalse(Banner.objects.exists())
+
+
+class PublishJobWorkerTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='publisher')
+        self.banners = create_banners(2)
+        self.worker = LocalPublishWorker()
+
+    def test_done(self):
+        job = PublishJob.objects.create(created_by=self.user)
+        self.worker.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, PublishJobState.STATE_DONE.value)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(
+            job.publication, Publication.objects.get_live_publication(),
+        )
+        self.assertEqual(
+            (job.num_re_published, job.num_newly_published), (0, 2),
+        )
+        self.assertIsNotNone(job.started_at)
+        self.assertIsNotNone(job.finished_at)
+
+    @mock.patch(
+        'banners.jobs.publish_publication',
+        side_effect=RuntimeError('Publish broke'),
+    )
+    def test_failed(self, publish_publication):
+        job = PublishJob.objects.create(created_by=self.user)
+        with self.assertLogs('banners.jobs', 'ERROR'):
+            self.worker.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, PublishJobState.STATE_FAILED.value)
+        self.assertIn('RuntimeError: Publish broke', job.error)
+        self.assertIsNone(job.publication)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_fail_stale_jobs(self):
+        old_queued, queued, running, done = PublishJob.objects.bulk_create(
+            PublishJob(created_by=self.user, state=state.value)
+            for state in (
+                PublishJobState.STATE_QUEUED,
+                PublishJobState.STATE_QUEUED,
+                PublishJobState.STATE_RUNNING,
+                PublishJobState.STATE_DONE,
+            )
+        )
+        PublishJob.objects.filter(id=old_queued.id).update(
+            create_time=timezone.now() - datetime.timedelta(hours=1),
+        )
+
+        with self.assertLogs('banners.jobs', 'WARNING'):
+            self.assertEqual(self.worker.fail_stale_jobs(), 2)
+        self.assertEqual(
+            dict(PublishJob.objects.values_list('id', 'state')),
+            {
+                old_queued.id: PublishJobState.STATE_FAILED.value,
+                queued.id: PublishJobState.STATE_QUEUED.value,
+                running.id: PublishJobState.STATE_FAILED.value,
+                done.id: PublishJobState.STATE_DONE.value,
+            },
+        )
+
+
+class PublishJobViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('editor', password='editor')
+        cls.job = PublishJob.objects.create(
+            created_by=cls.user, error='Traceback',
+        )
+        cls.url = f'/api/v1/banners/publish-jobs/{cls.job.id}/'
+
+    def get(self):
+        return self.client.get(self.url, HTTP_HOST='localhost')
+
+    def test_anonymous(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_not_staff(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], str(self.job.id))
+
+
+class NegotiateEncodingTest(SimpleTestCase):
+
+    def test_negotiate(self):
+        for accept_encoding, encoding in (
+            ('', IDENTITY),
+            ('identity', IDENTITY),
+            ('deflate', IDENTITY),
+            ('gzip', 'gzip'),
+            ('gzip, deflate, br', 'br'),
+            ('gzip, zstd', 'zstd'),
+            ('br;q=0.5, gzip', 'gzip'),
+            ('br;q=0, gzip;q=0.1', 'gzip'),
+            ('GZIP', 'gzip'),
+            ('*', 'br'),
+            ('*;q=0.5, zstd', 'zstd'),
+            ('br;q=0', IDENTITY),
+            ('br;q=high, gzip', 'gzip'),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(
+                    negotiate_encoding(accept_encoding), encoding,
+                )
+
+
+class MatcherTest(SimpleTestCase):
+    now = datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+    def banner(self, id, priority=0, slot=1, page=1, stopped=False,
+               start_time=None, end_time=None,
+               countries=(), languages=(), segments=()):
+        return {
+            'id': id,
+            'priority': priority,
+            'slot': {'id': slot, 'page': {'id': page}},
+            'stopped': stopped,
+            'start_time': start_time,
+            'end_time': end_time,
+            'countries': list(countries),
+            'languages': list(languages),
+            'segments': list(segments),
+        }
+
+    def match(self, banners, page=1, slot=1, now=None, **filters):
+        matcher = Matcher(1, banners)
+        return [
+            banner['id']
+            for banner in matcher.match(page, slot, now or self.now, **filters)
+        ]
+
+    def test_unknown_slot(self):
+        self.assertEqual(self.match([self.banner(1)], slot=2), [])
+        self.assertEqual(self.match([self.banner(1)], page=2), [])
+
+    def test_stopped(self):
+        self.assertEqual(
+            self.match([self.banner(1, stopped=True), self.banner(2)]), [2],
+        )
+
+    def test_window(self):
+        start_time = '2020-01-01T12:00:00Z'
+        end_time = '2020-01-01T13:00:00Z'
+        banners = [self.banner(1, start_time=start_time, end_time=end_time)]
+        hour = datetime.timedelta(hours=1)
+        second = datetime.timedelta(seconds=1)
+        for now, ids in (
+            (self.now - second, []),
+            (self.now, [1]),
+            (self.now + hour - second, [1]),
+            (self.now + hour, []),
+        ):
+            with self.subTest(now=now):
+                self.assertEqual(self.match(banners, now=now), ids)
+
+        self.assertEqual(
+            self.match([self.banner(1, start_time=start_time)],
+                       now=self.now + 100 * hour),
+            [1],
+        )
+        self.assertEqual(
+            self.match([self.banner(1, end_time=end_time)],
+                       now=self.now - 100 * hour),
+            [1],
+        )
+
+    def test_empty_means_all(self):
+        banners = [
+            self.banner(1),
+            self.banner(2, countries=['FI'], languages=['fi']),
+        ]
+        self.assertEqual(self.match(banners), [1])
+        self.assertEqual(self.match(banners, country='FI'), [1])
+        self.assertEqual(
+            self.match(banners, country='FI', language='fi'), [1, 2],
+        )
+        self.assertEqual(
+            self.match(banners, country='DE', language='fi'), [1],
+        )
+
+    def test_segments(self):
+        banners = [
+            self.banner(1, segments=['members', 'staff']),
+            self.banner(2, segments=['guests']),
+        ]
+        self.assertEqual(self.match(banners), [])
+        self.assertEqual(self.match(banners, segments=['staff']), [1])
+        self.assertEqual(
+            self.match(banners, segments=['guests', 'members']), [1, 2],
+        )
+        self.assertEqual(self.match(banners, segments=['other']), [])
+
+    def test_priority(self):
+        banners = [
+            self.banner(1, priority=1),
+            self.banner(2, priority=3),
+            self.banner(3, priority=2),
+            self.banner(4, priority=5, slot=2),
+        ]
+        self.assertEqual(self.match(banners), [2, 3, 1])
+
+
+class LiveMatcherTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        cls.banner, = create_banners(1)
+
+    def setUp(self):
+        patcher = mock.patch('banners.api.payloads._live_matcher', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def match(self, matcher):
+        return [
+            banner['name']
+            for banner in matcher.match(
+                str(self.banner.slot.page_id), str(self.banner.slot_id),
+                timezone.now(), country='FI', segments=['members'],
+            )
+        ]
+
+    def test_no_live_publication(self):
+        self.assertIsNone(get_live_matcher())
+
+    def test_rebuilt_after_publish(self):
+        first, _, _ = publish_publication(self.user)
+        matcher = get_live_matcher()
+        self.assertEqual(matcher.publication_id, first.id)
+        self.assertEqual(self.match(matcher), [self.banner.name])
+        with self.assertNumQueries(1):
+            self.assertIs(get_live_matcher(), matcher)
+
+        other, = create_banners(1, slot=self.banner.slot)
+        other.priority = self.banner.priority + 1
+        other.save()
+        second, _, _ = publish_publication(self.user)
+        rebuilt = get_live_matcher()
+        self.assertIsNot(rebuilt, matcher)
+        self.assertEqual(rebuilt.publication_id, second.id)
+        self.assertEqual(
+            self.match(rebuilt), [other.name, self.banner.name],
+        )
+        self.assertEqual(self.match(matcher), [self.banner.name])
+
+
+class MetricsTest(SimpleTestCase):
+
+    def test_histogram(self):
+        histogram = Histogram(
+            'latency_seconds', 'Latency', labels=('view', ),
+            buckets=(1, 0.5),
+        )
+        for value in (0.25, 0.5, 0.75, 3):
+            histogram.observe(value, view='live')
+        self.assertEqual(
+            histogram.render(),
+            [
+                '# HELP latency_seconds Latency',
+                '# TYPE latency_seconds histogram',
+                'latency_seconds_bucket{view="live",le="0.5"} 2',
+                'latency_seconds_bucket{view="live",le="1"} 3',
+                'latency_seconds_bucket{view="live",le="+Inf"} 4',
+                'latency_seconds_sum{view="live"} 4.5',
+                'latency_seconds_count{view="live"} 4',
+            ],
+        )
+
+    def test_label_escaping(self):
+        histogram = Histogram('latency_seconds', 'Latency', labels=('view', ))
+        histogram.observe(0.1, view='say "hi"\\\n')
+        self.assertIn(
+            r'latency_seconds_count{view="say \"hi\"\\\n"} 1',
+            histogram.render(),
+        )
+
+    def test_counter(self):
+        counter = Counter('snapshots_total', 'Snapshots', labels=('kind', ))
+        counter.inc(kind='created')
+        counter.inc(2, kind='reused')
+        counter.inc(3, kind='created')
+        self.assertEqual(
+            counter.render(),
+            [
+                '# HELP snapshots_total Snapshots',
+                '# TYPE snapshots_total counter',
+                'snapshots_total{kind="created"} 4',
+                'snapshots_total{kind="reused"} 2',
+            ],
+        )
+
+    def test_registry(self):
+        registry = Registry()
+        registry.register(Counter('requests_total', 'Requests')).inc()
+        self.assertEqual(
+            registry.render(),
+            '# HELP requests_total Requests\n'
+            '# TYPE requests_total counter\n'
+            'requests_total 1\n',
+        )
+
+
+class MetricsMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        create_banners(2)
+        publish(cls.user)
+
+    def get_samples(self):
+        response = self.client.get('/metrics', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'],
+            'text/plain; version=0.0.4; charset=utf-8',
+        )
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_request(self):
+        series = (
+            'bsadmin_http_request_duration_seconds_count'
+            '{view="LiveBannersView",method="GET",status="200"}',
+            'bsadmin_http_request_db_queries_count{view="LiveBannersView"}',
+            'bsadmin_http_request_db_duration_seconds_count'
+            '{view="LiveBannersView"}',
+            'bsadmin_http_response_size_bytes_count{view="LiveBannersView"}',
+        )
+        before = self.get_samples()
+        response = self.client.get(
+            '/api/v1/banners/live/', HTTP_HOST='localhost',
+        )
+        after = self.get_samples()
+        for name in series:
+            with self.subTest(series=name):
+                self.assertEqual(after[name] - before.get(name, 0), 1)
+
+        size = 'bsadmin_http_response_size_bytes_sum{view="LiveBannersView"}'
+        self.assertEqual(
+            after[size] - before.get(size, 0), len(response.content),
+        )
+
+    @mock.patch(
+        'banners.metrics.transaction.on_commit',
+        side_effect=lambda callback: callback(),
+    )
+    def test_publish(self, on_commit):
+        before = self.get_samples()
+        publication, _, _ = publish_publication(self.user)
+        after = self.get_samples()
+
+        for phase, _ in publication.build_phases:
+            name = 'bsadmin_publish_phase_duration_seconds_count' \
+                f'{{phase="{phase}"}}'
+            with self.subTest(phase=phase):
+                self.assertEqual(after[name] - before.get(name, 0), 1)
+        self.assertEqual(
+            after['bsadmin_publish_duration_seconds_count'] -
+            before.get('bsadmin_publish_duration_seconds_count', 0),
+            1,
+        )
+        reused = 'bsadmin_published_snapshots_total{kind="reused"}'
+        self.assertEqual(
+            after[reused] - before.get(reused, 0),
+            publication.num_re_published,
+        )
+
+
+class PayloadCompressionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_banners(2)
+        publish(User.objects.create(username='publisher'))
+        cls.publication = Publication.objects.get_live_publication()
+        cls.content = bytes(get_payload_content(cls.publication))
+
+    def test_compress_publication(self):
+        payloads = compress_publication(self.publication)
+        # full payload and one page, in every coding
+        self.assertEqual(len(payloads), 2 * 3)
+        for encoding in ('br', 'zstd', 'gzip'):
+            content = get_payload_content(self.publication, None, encoding)
+            self.assertEqual(
+                DECOMPRESSORS[encoding](bytes(content)), self.content,
+            )
+        self.assertEqual(compress_publication(self.publication), [])
+
+    def test_compressed_on_request(self):
+        content = get_payload_content(self.publication, None, 'br')
+        self.assertEqual(DECOMPRESSORS['br'](bytes(content)), self.content)
+        self.assertTrue(
+            self.publication.payloads.filter(encoding='br').exists(),
+        )
+
+    @mock.patch('banners.api.payloads.lock_payload', return_value=False)
+    def test_compressed_by_another_request(self, lock_payload):
+        self.assertIsNone(
+            get_payload_content(self.publication, None, 'br'),
+        )
+        response = self.client.get(
+            '/api/v1/banners/live/',
+            HTTP_HOST='localhost',
+            HTTP_ACCEPT_ENCODING='br',
+        )
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.content, self.content)
+        self.assertEqual(response['ETag'], f'"{self.publication.id.hex}"')
+
+
+class PayloadRetentionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        create_banners(2)
+        cls.publications = []
+        for _ in range(4):
+            publish(cls.user)
+            publication = Publication.objects.get_live_publication()
+            compress_publication(publication)
+            cls.publications.append(publication)
+
+    def assertKept(self, publications):
+        self.assertEqual(
+            set(
+                PublicationPayload.objects.
+                values_list('publication_id', flat=True)
+            ),
+            {publication.id for publication in publications},
+        )
+
+    def test_prune(self):
+        self.assertEqual(prune_payloads(keep=1), 2 * 4 * 2)
+        self.assertKept(self.publications[-2:])
+        self.assertEqual(prune_payloads(keep=1), 0)
+
+    def test_keep_none(self):
+        prune_payloads(keep=0)
+        self.assertKept(self.publications[-1:])
+
+    def test_setting(self):
+        with override_settings(BSADMIN_SETTINGS=dict(
+            settings.BSADMIN_SETTINGS, PAYLOADS_KEEP=2,
+        )):
+            prune_payloads()
+        self.assertKept(self.publications[-3:])
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('prune_payloads', keep=2, stdout=out)
+        self.assertEqual(out.getvalue(), '8 payloads deleted\n')
+        self.assertKept(self.publications[-3:])
+
+
+class ArtifactsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+        cls.banners = create_banners(2)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def write(self):
+        publish(self.user)
+        publication = Publication.objects.get_live_publication()
+        return publication, write_artifacts(publication, self.directory)
+
+    def test_manifest(self):
+        publication, target = self.write()
+        with open(os.path.join(target, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        page = self.banners[0].slot.page_id
+        self.assertEqual(manifest['id'], str(publication.id))
+        self.assertEqual(
+            sorted(manifest['files']),
+            sorted(
+                name + extension
+                for name in ('live.json', f'pages/{page}.json')
+                for extension in ('', '.br', '.gz', '.zst')
+            ),
+        )
+        for name, stats in manifest['files'].items():
+            with open(os.path.join(target, name), 'rb') as f:
+                content = f.read()
+            self.assertEqual(stats['size'], len(content))
+            self.assertEqual(
+                stats['sha256'], hashlib.sha256(content).hexdigest(),
+            )
+        with open(os.path.join(target, 'live.json'), 'rb') as f:
+            self.assertEqual(
+                f.read(), bytes(get_payload_content(publication)),
+            )
+
+    def test_current(self):
+        for _ in range(2):
+            publication, target = self.write()
+            current = os.path.join(self.directory, 'current')
+            self.assertEqual(os.readlink(current), str(publication.id))
+            self.assertEqual(os.path.realpath(current), target)
+        # only complete publications, no temporary files are left
+        self.assertFalse(
+            [
+                name for name in os.listdir(self.directory)
+                if name.startswith('.')
+            ]
+        )
+
+    def test_finished_out_of_order(self):
+        old_publication, old_target = self.write()
+        publication, target = self.write()
+        current = os.path.join(self.directory, 'current')
+        # the deactivated publication finishes writing last
+        self.assertEqual(
+            write_artifacts(old_publication, self.directory), old_target,
+        )
+        self.assertEqual(os.readlink(current), str(publication.id))
+        self.assertTrue(os.path.isdir(old_target))
+        self.assertFalse(
+            [
+                name for name in os.listdir(self.directory)
+                if name.startswith('.')
+            ]
+        )
+
+    def test_prune(self):
+        with override_settings(BSADMIN_SETTINGS=dict(
+            settings.BSADMIN_SETTINGS, ARTIFACTS_KEEP=2,
+        )):
+            names = []
+            for age in (3, 2, 1, 0):
+                publication, target = self.write()
+                names.append(str(publication.id))
+                # older publications were written earlier
+                written = time.time() - age
+                os.utime(target, (written, written))
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted(names[-2:] + ['current']),
+        )
+
+
+class IncrementalPublishTest(TestCase):
+    """
+    Publishing only the journaled banners has to give the same live
+    banners as publishing all of them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='publisher')
+
+    def setUp(self):
+        self.banners = create_banners(3) + create_banners(2)
+        self.slot = self.banners[-1].slot
+        publish(self.user)
+        self.publication = Publication.objects.get_live_publication()
+
+    def assertPublished(self, banners):
+        publication = Publication.objects.get_live_publication()
+        self.assertEqual(
+            sorted(
+                (snapshot.original_banner_id, snapshot.content_hash)
+                for snapshot in publication.banners.all()
+            ),
+            sorted(
+                (banner.id, banner.content_hash)
+                for banner in Banner.objects.filter(
+                    id__in=[banner.id for banner in banners],
+                )
+            ),
+        )
+        self.assertSetEqual(
+            set(publication.banners.values_list('id', flat=True)),
+            set(publication.snapshots_log.values_list('id', flat=True)),
+        )
+        self.assertFalse(BannerChange.objects.pending().exists())
+        return publication
+
+    def test_nothing_changed(self):
+        self.assertEqual(publish(self.user), (5, 0))
+        self.assertPublished(self.banners)
+
+    def test_saved(self):
+        banner = self.banners[0]
+        banner.body = '<p>Changed</p>'
+        banner.save()
+        self.assertEqual(publish(self.user), (4, 1))
+        self.assertPublished(self.banners)
+
+    def test_deactivated(self):
+        self.banners[0].delete()
+        Banner.objects.filter(id=self.banners[1].id).delete()
+        publish(self.user)
+        self.assertPublished(self.banners[2:])
+
+    def test_not_journaled(self):
+        # deactivated and hidden the way it was done before the journal
+        Banner.objects.filter(id=self.banners[0].id).update(active=False)
+        Slot.objects.filter(id=self.slot.id).update(hidden=True)
+        publish(self.user)
+        self.assertPublished(self.banners[1:3])
+
+    def test_duplicated_nothing(self):
+        self.assertEqual(Banner.objects.none().duplicate(), [])
+        self.assertFalse(BannerChange.objects.pending().exists())
+
+    def test_republish_nothing(self):
+        publication, _, _ = publish_publication(
+            self.user, banners=Banner.objects.none(),
+        )
+        self.assertEqual(
+            (publication.num_re_published, publication.num_newly_published),
+            (5, 0),
+        )
+        self.assertPublished(self.banners)
+        self.assertEqual(
+            Banner.objects.filter(id__in=[]).
+            republish_snapshots(publication),
+            (0, 0),
+        )
+
+    def test_duplicated(self):
+        new_banners = Banner.objects.filter(slot=self.slot).duplicate()
+        self.assertEqual(publish(self.user), (5, 2))
+        self.assertPublished(self.banners + new_banners)
+
+    def test_slot_hidden(self):
+        self.slot.hidden = True
+        self.slot.save()
+        publish(self.user)
+        self.assertPublished(self.banners[:3])
+
+        self.slot.hidden = False
+        self.slot.save()
+        self.assertEqual(publish(self.user), (5, 0))
+        self.assertPublished(self.banners)
+
+    def test_page_renamed(self):
+        page = self.slot.page
+        page.name = 'renamed page'
+        page.save()
+        self.assertEqual(publish(self.user), (3, 2))
+        publication = self.assertPublished(self.banners)
+        self.assertEqual(
+            set(
+                snapshot.slot['page']['name']
+                for snapshot in publication.banners.filter(
+                    original_banner__slot=self.slot,
+                )
+            ),
+            {'renamed page'},
+        )
+
+    def test_full(self):
+        banner = self.banners[0]
+        banner.body = '<p>Changed</p>'
+        banner.save()
+        self.assertEqual(publish(self.user, full=True), (4, 1))
+        self.assertPublished(self.banners)
+
+    def test_full_not_journaled(self):
+        banner = self.banners[0]
+        Banner.objects.filter(id=banner.id).update(priority=42)
+        self.assertEqual(publish(self.user, full=True), (4, 1))
+        self.assertPublished(self.banners)
+        snapshot = Publication.objects.get_live_publication().banners.\
+            get(original_banner=banner)
+        self.assertEqual(snapshot.priority, 42)
+
+    def test_selected(self):
+        selected, draft = self.banners[:2]
+        for banner in (selected, draft):
+            banner.body = f'<p>Changed {banner.name}</p>'
+            banner.save()
+        draft_snapshot = draft.snapshots.get()
+
+        self.assertEqual(
+            publish(self.user, banners=Banner.objects.filter(id=selected.id)),
+            (4, 1),
+        )
+        publication = Publication.objects.get_live_publication()
+        self.assertEqual(
+            set(publication.banners.values_list('id', flat=True)),
+            set(publication.snapshots_log.values_list('id', flat=True)),
+        )
+        self.assertEqual(
+            publication.banners.get(original_banner=selected).content_hash,
+            Banner.objects.get(id=selected.id).content_hash,
+        )
+        self.assertEqual(
+            publication.banners.get(original_banner=draft), draft_snapshot,
+        )
+        self.assertEqual(
+            list(
+                BannerChange.objects.pending().
+                values_list('banner_id', flat=True)
+            ),
+            [draft.id],
+        )
+
+        self.assertEqual(publish(self.user), (4, 1))
+        self.assertPublished(self.banners)
+
+    def test_selected_keeps_other_deactivations(self):
+        selected, deactivated, hidden = self.banners[0], *self.banners[3:]
+        selected.body = '<p>Changed</p>'
+        selected.save()
+        deactivated.delete()
+        self.slot.hidden = True
+        self.slot.save()
+
+        self.assertEqual(
+            publish(self.user, banners=Banner.objects.filter(id=selected.id)),
+            (4, 1),
+        )
+        publication = Publication.objects.get_live_publication()
+        self.assertEqual(
+            set(
+                publication.banners.
+                values_list('original_banner_id', flat=True)
+            ),
+            {banner.id for banner in self.banners},
+        )
+        self.assertEqual(
+            set(
+                BannerChange.objects.pending().
+                values_list('banner_id', flat=True)
+            ),
+            {deactivated.id, hidden.id},
+        )
+
+        publish(self.user)
+        self.assertPublished(self.banners[:3])
+
+    def test_selected_job(self):
+        selected = self.banners[0]
+        selected.body = '<p>Changed</p>'
+        selected.save()
+        job = PublishJob.objects.create(created_by=self.user)
+        self.assertIsNone(job.get_banners())
+        job.banners.set([selected])
+        selected.delete()
+        self.assertEqual(
+            list(job.get_banners().values_list('id', flat=True)),
+            [selected.id],
+        )
+
+
+class BuildStatsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'admin',
+        )
+        cls.banners = create_banners(3)
+
+    def assertBuildStats(self, publication, phases, num_re_published,
+                         num_newly_published):
+        publication.refresh_from_db()
+        self.assertEqual(
+            [phase for phase, _ in publication.build_phases], phases,
+        )
+        self.assertTrue(
+            all(seconds >= 0 for _, seconds in publication.build_phases)
+        )
+        self.assertGreaterEqual(
+            publication.build_duration,
+            sum(seconds for _, seconds in publication.build_phases),
+        )
+        self.assertEqual(publication.num_re_published, num_re_published)
+        self.assertEqual(
+            publication.num_newly_published, num_newly_published,
+        )
+        self.assertEqual(
+            publication.payload_size,
+            len(get_payload_content(publication)),
+        )
+        self.assertGreater(publication.num_queries, 0)
+
+    def test_publish(self):
+        with CaptureQueriesContext(connection) as queries:
+            publication, _, _ = publish_publication(self.user)
+        self.assertBuildStats(
+            publication,
+            [
+                'deactivate', 'collect_changes', 'rehash', 'republish',
+                'create_snapshots', 'log_snapshots', 'mark_published',
+                'materialize',
+            ],
+            0, 3,
+        )
+        # saving the statistics and announcing are not counted
+        self.assertLess(publication.num_queries, len(queries))
+
+        banner = self.banners[0]
+        banner.body = '<p>Changed</p>'
+        banner.save()
+        publication, _, _ = publish_publication(self.user)
+        self.assertBuildStats(
+            publication,
+            [
+                'deactivate', 'collect_changes', 'carry_forward',
+                'republish', 'create_snapshots', 'log_snapshots',
+                'mark_published', 'materialize',
+            ],
+            2, 1,
+        )
+
+    def test_admin(self):
+        publication, _, _ = publish_publication(self.user)
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:banners_publication_change', args=[publication.id]),
+            HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.status_code, 200)
+        for phase, seconds in publication.build_phases:
+            self.assertContains(
+                response, f'<div>{phase}: {round(seconds, 3)}s</div>',
+                html=True,
+            )
+        self.assertContains(response, 'Build phases')
+
+
+class SnapshotEncoderParityTest(TestCase):
+    """
+    The fast encoder has to render exactly what the serializers render.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='publisher')
+        banners = create_banners(3)
+        banners[0].body = 'Quotes " \\ and unicode \u00e9 \U0001F600 \u2028'
+        banners[0].start_time = timezone.now()
+        banners[0].end_time = datetime.datetime(
+            2030, 1, 1, 12, 30, 15, 123,
+            tzinfo=datetime.timezone(datetime.timedelta(hours=3)),
+        )
+        banners[0].languages = ['fi', 'en']
+        banners[0].save()
+        banners[1].countries = []
+        banners[1].segments = []
+        banners[1].stopped = True
+        banners[1].save()
+        publish(user)
+        cls.publication = Publication.objects.get_live_publication()
+
+    def render_with_serializer(self):
+        return JSONRenderer().render(
+            BannerSnapshotModelSerializer(
+                self.publication.banners.with_body(), many=True,
+            ).data
+        )
+
+    def test_banners(self):
+        self.assertEqual(
+            dumps(encode_banners(self.publication.banners.all())),
+            self.render_with_serializer(),
+        )
+
+    def test_payload(self):
+        banners = list(self.publication.banners.with_body())
+        result = OrderedDict((
+            ('count', len(banners)),
+            ('next', None),
+            ('previous', None),
+        ))
+        result.update(
+            BannerPublicationSerializer({
+                'id': self.publication.id,
+                'published_at': self.publication.published_at,
+                'banners': banners,
+            }).data
+        )
+        result['index'] = build_index(result['banners'])
+        self.assertEqual(
+            render_payload(
+                self.publication,
+                encode_banners(self.publication.banners.all()),
+            ),
+            JSONRenderer().render(result),
+        )
+
+    def test_delta(self):
+        user = User.objects.get(username='publisher')
+        changed, _, removed = Banner.objects.order_by('create_time')
+        changed.body = '<p>Changed</p>'
+        changed.save()
+        removed.delete()
+        create_banners(1, slot=changed.slot)
+        publish(user)
+        publication = Publication.objects.get_live_publication()
+
+        response = self.client.get(
+            '/api/v1/banners/live/', {'since': str(self.publication.id)},
+            HTTP_HOST='localhost',
+        )
+        delta = json.loads(response.content)
+        self.assertEqual(
+            (len(delta['added']), len(delta['changed']),
+             len(delta['removed'])),
+            (1, 1, 2),
+        )
+
+        def get_snapshots(banners):
+            snapshots = publication.banners.with_body().in_bulk(
+                [banner['id'] for banner in banners],
+            )
+            return [
+                snapshots[uuid.UUID(banner['id'])] for banner in banners
+            ]
+
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(
+                BannerPublicationDeltaSerializer({
+                    'id': publication.id,
+                    'published_at': publication.published_at,
+                    'since': self.publication.id,
+                    'added': get_snapshots(delta['added']),
+                    'changed': get_snapshots(delta['changed']),
+                    'removed': delta['removed'],
+                }).data
+            ),
+        )
+
+    def test_stream(self):
+        serialized = BannerSnapshotModelSerializer(
+            self.publication.banners.with_body(), many=True,
+        ).data
+        self.assertEqual(
+            list(stream_banners(self.publication.banners.all())),
+            [JSONRenderer().render(banner) + b'\n' for banner in serialized],
+        )
+
+    def test_null_values(self):
+        encoder = SnapshotEncoder()
+        row = [None] * len(encoder.columns)
+        self.assertEqual(encoder.encode(row), dict.fromkeys(encoder.names))
@@ -1,8 +1,18 @@
 from django.conf.urls import url
 
-from banners.api.views import LiveBannersView
+from banners.api.views import (
+    LiveBannersView, LivePublicationChangesView, PublishJobView,
+    ResolveBannersView,
+)
 
 urlpatterns = [
-    url(r'^live/$', LiveBannersView.as_view(), name='')
+    url(r'^live/$', LiveBannersView.as_view(), name=''),
+    url(r'^live/changes/$', LivePublicationChangesView.as_view(), name=''),
+    url(r'^resolve/$', ResolveBannersView.as_view(), name=''),
+    url(
+        r'^publish-jobs/(?P<job_id>[0-9a-f-]+)/$',
+        PublishJobView.as_view(),
+        name='',
+    ),
 ]
 
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'banners.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -140,5 +141,22 @@ BSADMIN_SETTINGS = {
     ),
     'SUPPORTED_COUNTRIES': (
         'FI', 'DE', 'UK',
-    )
+    ),
+    # seconds a long-poll request for publication changes may block
+    'LONG_POLL_MAX_TIMEOUT': 20,
+    # long-poll requests blocking at a time per process, has to stay
+    # below the number of worker threads
+    'LONG_POLL_MAX_WAITERS': int(
+        os.environ.get('BSADMIN_LONG_POLL_MAX_WAITERS', 4)
+    ),
+    # seconds between live publication checks of a waiting long-poll
+    'LONG_POLL_INTERVAL': 5,
+    # seconds after which a publish job that did not start is failed
+    'PUBLISH_JOB_QUEUED_TIMEOUT': 30 * 60,
+    # directory for static publication artifacts, disabled when empty
+    'ARTIFACTS_DIR': os.environ.get('BSADMIN_ARTIFACTS_DIR'),
+    # publications kept in the artifacts directory
+    'ARTIFACTS_KEEP': int(os.environ.get('BSADMIN_ARTIFACTS_KEEP', 5)),
+    # deactivated publications whose stored payloads are kept
+    'PAYLOADS_KEEP': int(os.environ.get('BSADMIN_PAYLOADS_KEEP', 5)),
 }
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from banners.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/v1/banners/', include('banners.urls'))
+    path('api/v1/banners/', include('banners.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,73 @@
+import json
+
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """
+    Number of rows the Postgres planner expects ``queryset`` to return,
+    taken from table statistics instead of counting. Returns ``None``
+    when there is no estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts planner estimates for large unfiltered
+    tables, exact counts are only made below ``exact_count_limit``
+    rows. Filtered or searched querysets are always counted exactly,
+    estimates of their conditions can be off by orders of magnitude.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query') and \
+                not self.object_list.query.where:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and \
+                    estimate >= self.exact_count_limit:
+                return estimate
+        return super(EstimatedCountPaginator, self).count
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """
+    Inline formset showing a single page of related objects, selected
+    by the ``page_param`` query parameter.
+
+    ``request`` is set on the formset class by the inline admin.
+    """
+    request = None
+    per_page = 50
+    page_param = 'page'
+    paginator_class = EstimatedCountPaginator
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            # ordered by pk unless the model has an ordering
+            queryset = super(PaginatedInlineFormSet, self).get_queryset()
+            self.paginator = self.paginator_class(queryset, self.per_page)
+            self.page = self.paginator.get_page(
+                self.request.GET.get(self.page_param)
+                if self.request is not None else None
+            )
+            self._queryset = self.page.object_list
+        return self._queryset
@@ -0,0 +1,167 @@
+import difflib
+import re
+import time
+from collections import Counter
+
+from django.db import connection
+
+
+NORMALIZE_PATTERNS = (
+    # placeholders, quoted literals and numbers, so queries differing
+    # only in values compare equal
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'"s\d+_x\d+"'), '"savepoint"'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+    # IN lists and multi row VALUES of any length
+    (re.compile(r'\((?:\?, )*\?\)'), '(...)'),
+    (re.compile(r'(\((?:[^()]|\([^()]*\))*\))(?:, \1)+'), r'\1'),
+)
+
+
+def normalize_sql(sql):
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class RecordedQuery(object):
+
+    def __init__(self, sql, params, duration):
+        self.sql = sql
+        self.params = params
+        self.duration = duration
+
+    @property
+    def shape(self):
+        return normalize_sql(self.sql)
+
+    def __str__(self):
+        return f'{self.duration * 1000:8.2f}ms  {self.sql}'
+
+
+class QueryRecorder(object):
+    """
+    Records every SQL statement executed on ``connection`` with its
+    duration, also when ``DEBUG`` is off::
+
+        with QueryRecorder() as recorder:
+            client.get(url)
+        print(recorder.report())
+    """
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []
+
+    def __enter__(self):
+        self.wrapper = self.connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                RecordedQuery(sql, params, time.perf_counter() - started)
+            )
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    @property
+    def shapes(self):
+        return [query.shape for query in self.queries]
+
+    def repeated(self):
+        """
+        Query shapes executed more than once, the usual N+1 suspects.
+        """
+        return [
+            (shape, count)
+            for shape, count in Counter(self.shapes).most_common()
+            if count > 1
+        ]
+
+    def report(self):
+        lines = [
+            f'{len(self)} queries in {self.duration * 1000:.2f}ms',
+        ]
+        lines.extend(str(query) for query in self.queries)
+        repeated = self.repeated()
+        if repeated:
+            lines.append('Repeated:')
+            lines.extend(f'{count:8}x  {shape}' for shape, count in repeated)
+        return '\n'.join(lines)
+
+    def diff(self, other):
+        """
+        Unified diff of normalized queries of this and ``other``
+        recording.
+        """
+        return '\n'.join(
+            difflib.unified_diff(
+                self.shapes, other.shapes,
+                fromfile=f'{len(self)} queries',
+                tofile=f'{len(other)} queries',
+                lineterm='',
+            )
+        )
+
+
+class QueryBudgetMixin(object):
+    """
+    Test case assertions on the queries a code path makes.
+    """
+
+    def record_queries(self, func, *args, **kwargs):
+        with QueryRecorder() as recorder:
+            func(*args, **kwargs)
+        return recorder
+
+    def assertQueryBudget(self, budget, func, *args, max_duration=None,
+                          **kwargs):
+        """
+        Fails when ``func`` makes more than ``budget`` queries or,
+        if given, spends more than ``max_duration`` seconds in them.
+        """
+        recorder = self.record_queries(func, *args, **kwargs)
+        if len(recorder) > budget:
+            self.fail(
+                f'Query budget of {budget} exceeded\n{recorder.report()}'
+            )
+        if max_duration is not None and recorder.duration > max_duration:
+            self.fail(
+                f'Query time budget of {max_duration * 1000:.0f}ms '
+                f'exceeded\n{recorder.report()}'
+            )
+        return recorder
+
+    def assertConstantQueries(self, budget, func, grow, *args, **kwargs):
+        """
+        Runs ``func``, lets ``grow`` add more data and runs it again.
+        Fails when the second run makes other queries than the first
+        one or when any run exceeds ``budget``.
+
+        ``func`` is called once more beforehand, so queries filling
+        process caches (content types, permissions) are not counted.
+        """
+        func(*args, **kwargs)
+        before = self.assertQueryBudget(budget, func, *args, **kwargs)
+        grow()
+        after = self.assertQueryBudget(budget, func, *args, **kwargs)
+        if before.shapes != after.shapes:
+            self.fail(
+                f'Queries changed as data grew\n{before.diff(after)}\n\n'
+                f'{after.report()}'
+            )
+        return after